@@ -0,0 +1,64 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Flushing document structures from asyncio code.
+
+This module uses syntax that needs Python 3.6 or later, so it is only
+imported by ``DocumentStructure.aflush``.
+"""
+import asyncio
+import inspect
+
+
+async def aflush(doc, target=None, normalizer=None):
+    """Yields the encoded chunks of a doc structure, section by section."""
+    async for chunk in _iter_flush(doc, target):
+        if normalizer is not None:
+            chunk = normalizer.feed(chunk)
+        if chunk:
+            yield chunk
+    if len(doc._path_key) == 1:
+        # The link targets are written after the sections, like
+        # flush_page writes them, so the first chunk is not held back
+        # until every section that could add one was written.
+        chunk = doc._link_targets_value()
+        if normalizer is not None:
+            chunk = normalizer.feed(chunk)
+        if chunk:
+            yield chunk
+    if normalizer is not None:
+        chunk = normalizer.close()
+        if chunk:
+            yield chunk
+
+
+async def _render(section):
+    if section._render is not None:
+        result = section._call_render()
+        if inspect.isawaitable(result):
+            await result
+    section._parse_deferred_doc_strings()
+    # Let other tasks run between sections.
+    await asyncio.sleep(0)
+
+
+async def _iter_flush(section, target, at_line_start=True):
+    await _render(section)
+    for chunk in section._iter_value(target, at_line_start):
+        if chunk:
+            at_line_start = chunk.endswith(b'\n')
+        yield chunk
+    for subsection in list(section._structure.values()):
+        async for chunk in _iter_flush(subsection, target, at_line_start):
+            if chunk:
+                at_line_start = chunk.endswith(b'\n')
+            yield chunk
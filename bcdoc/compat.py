@@ -10,8 +10,29 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
+import os
+
+import six
+
 try:
     from collections import OrderedDict
 except ImportError:
     # Python2.6 we use the 3rd party back port.
     from ordereddict import OrderedDict
+
+
+try:
+    from os import replace as replace_file
+except ImportError:
+    # Python2 has no os.replace, and os.rename does not overwrite an
+    # existing file on Windows.
+    def replace_file(src, dst):
+        if os.name != 'nt':
+            os.rename(src, dst)
+            return
+        import ctypes
+        move_file_replace_existing = 0x1
+        if not ctypes.windll.kernel32.MoveFileExW(
+                six.text_type(src), six.text_type(dst),
+                move_file_replace_existing):
+            raise ctypes.WinError()
@@ -0,0 +1,290 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import json
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import unquote, urlsplit
+
+from bcdoc.compat import OrderedDict
+from bcdoc.restdoc import DocumentStructure
+from bcdoc.style import HTMLStyle, ReSTStyle
+
+STATS_PATH = '/_stats'
+
+_MISSING = object()
+
+
+class SectionCache(object):
+    """A least recently used cache of flushed pages keyed by their path.
+
+    Once either limit is exceeded the least recently used pages are
+    evicted until the cache is within both again.  A page larger than
+    ``max_bytes`` on its own is not cached at all.  A page of None
+    records that there is no page at the path.
+
+    :param max_entries: The most pages to keep, or None for no limit.
+    :param max_bytes: The most bytes of pages to keep, or None for no
+        limit.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._values = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, path):
+        return tuple(path) in self._values
+
+    def get(self, path, default=None):
+        """Returns the page at path, or default if it is not cached."""
+        path = tuple(path)
+        with self._lock:
+            value = self._values.pop(path, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._values[path] = value
+            return value
+
+    def peek(self, path, default=None):
+        """Returns the page at path like ``get`` without counting it."""
+        with self._lock:
+            return self._values.get(tuple(path), default)
+
+    def put(self, path, value):
+        """Caches the page at path as the most recently used one."""
+        path = tuple(path)
+        size = _size(value)
+        with self._lock:
+            previous = self._values.pop(path, _MISSING)
+            if previous is not _MISSING:
+                self._size -= _size(previous)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._values[path] = value
+            self._size += size
+            self._evict()
+
+    def _evict(self):
+        while ((self.max_entries is not None and
+                len(self._values) > self.max_entries) or
+               (self.max_bytes is not None and self._size > self.max_bytes)):
+            path = next(iter(self._values))
+            self._size -= _size(self._values.pop(path))
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._size = 0
+
+    def stats(self):
+        """Returns the cache's counters and size as a dict."""
+        with self._lock:
+            return {
+                'entries': len(self._values),
+                'bytes': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def _size(value):
+    if value is None:
+        return 0
+    return len(value)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _DocRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server.doc_server
+        path = unquote(urlsplit(self.path).path)
+        if path == STATS_PATH:
+            body = json.dumps(server.stats(), sort_keys=True)
+            self._send(200, 'application/json', body.encode('utf-8'))
+            return
+        page_path = tuple(part for part in path.split('/') if part)
+        try:
+            value = server.get_page(page_path)
+        except Exception:
+            self.send_error(500)
+            raise
+        if value is None:
+            self.send_error(404)
+            return
+        self._send(200, server.content_type, value)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DocServer(object):
+    """Serves documentation pages over HTTP, writing them when requested.
+
+    A generation function is registered for each document.  It is called
+    with a new ``DocumentStructure`` named after the document whenever a
+    page of it that is not cached is requested.  Only the requested page
+    is flushed, like ``flush_page`` does, so a function that adds the
+    sections of the document with ``add_lazy_section`` only has those on
+    the page written.  The pages, and the paths found to have no page,
+    are kept in a ``SectionCache``.
+
+    A page is requested by its path, e.g. ``/s3`` or ``/s3/get_object``.
+    ``/_stats`` returns the cache and rendering counters as JSON.
+
+    :param host: The address to listen on.
+    :param port: The port to listen on, 0 to pick a free one.
+    :param depth: How many levels below each document the sections that
+        become pages are, as for ``flush_pages``.
+    :param cache: The ``SectionCache`` to keep pages in.
+    :param style_class: The style to write the documents with.
+    :param target: The target to write the documents for.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, depth=1, cache=None,
+                 style_class=ReSTStyle, target='html'):
+        self.depth = depth
+        if cache is None:
+            cache = SectionCache()
+        self.cache = cache
+        self.style_class = style_class
+        self.target = target
+        self._generators = {}
+        # A lock for each document, so a page is only written by one
+        # thread at a time while pages of other documents are written
+        # alongside it.
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.render_time = 0.0
+        self._httpd = _ThreadingHTTPServer((host, port), _DocRequestHandler)
+        self._httpd.doc_server = self
+        self._thread = None
+
+    @property
+    def content_type(self):
+        if issubclass(self.style_class, HTMLStyle):
+            return 'text/html; charset=utf-8'
+        return 'text/plain; charset=utf-8'
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%s' % (host, port)
+
+    def register(self, name, generate):
+        """Registers the function that writes the document called name.
+
+        The cache is cleared since it may hold pages written by a
+        function registered before.
+        """
+        with self._lock:
+            self._locks.setdefault(name, threading.Lock())
+            self._generators[name] = generate
+        self.cache.clear()
+
+    def get_page(self, path):
+        """Returns the flushed page at path, writing its document if needed.
+
+        :returns: The page, or None if there is no page at path.
+        """
+        path = tuple(path)
+        if not path or path[0] not in self._generators:
+            return None
+        # Pages are the document itself and the sections depth levels
+        # below it.
+        if len(path) != 1 and len(path) != self.depth + 1:
+            return None
+        value = self.cache.get(path, _MISSING)
+        if value is not _MISSING:
+            return value
+        # Only one thread writes a page of a document at a time; the
+        # others find the page cached once it is done.
+        with self._locks[path[0]]:
+            value = self.cache.peek(path, _MISSING)
+            if value is _MISSING:
+                value = self._render(path)
+                self.cache.put(path, value)
+        return value
+
+    def _render(self, path):
+        start = time.time()
+        section = DocumentStructure(path[0], target=self.target,
+                                    style_class=self.style_class)
+        self._generators[path[0]](section)
+        value = None
+        for name in path[1:]:
+            # A lazy section may add the sections below it when written.
+            section._parse_deferred_doc_strings()
+            try:
+                section = section.get_section(name)
+            except KeyError:
+                break
+        else:
+            value = section.flush_page(self.depth if len(path) == 1 else 0)
+        with self._lock:
+            self.renders += 1
+            self.render_time += time.time() - start
+        return value
+
+    def stats(self):
+        """Returns the cache's stats along with rendering counters."""
+        stats = self.cache.stats()
+        with self._lock:
+            stats['renders'] = self.renders
+            stats['render_time'] = self.render_time
+        return stats
+
+    def serve_forever(self):
+        """Serves requests until ``stop`` is called."""
+        self._httpd.serve_forever()
+
+    def start(self):
+        """Serves requests from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving requests and closes the server's socket."""
+        self._httpd.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
@@ -10,6 +10,9 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
+import codecs
+
+import six
 from six.moves import html_parser
 
 
@@ -24,8 +27,36 @@ class DocStringParser(html_parser.HTMLParser):
         html_parser.HTMLParser.__init__(self)
         self.doc = doc
         self.unhandled_tags = []
+        # Text is held until the next tag since the HTML parser can
+        # hand over a run of text in pieces, e.g. when it is split
+        # across fed chunks.
+        self._pending_data = []
+
+    def feed(self, data):
+        html_parser.HTMLParser.feed(self, data)
+        self._handle_pending_data()
+
+    def feed_chunks(self, chunks):
+        """
+        Feeds a doc string in chunks without joining them first.
+
+        Tags and text may be split anywhere between the chunks.  Chunks
+        of bytes are decoded as utf-8.
+        """
+        decoder = None
+        for chunk in chunks:
+            if isinstance(chunk, six.binary_type):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder('utf-8')()
+                chunk = decoder.decode(chunk)
+            if chunk:
+                html_parser.HTMLParser.feed(self, chunk)
+        if decoder is not None:
+            html_parser.HTMLParser.feed(self, decoder.decode(b'', True))
+        self._handle_pending_data()
 
     def handle_starttag(self, tag, attrs):
+        self._handle_pending_data()
         handler_name = 'start_%s' % tag
         if hasattr(self.doc.style, handler_name):
             getattr(self.doc.style, handler_name)(attrs)
@@ -33,11 +64,19 @@ class DocStringParser(html_parser.HTMLParser):
             self.unhandled_tags.append(tag)
 
     def handle_endtag(self, tag):
+        self._handle_pending_data()
         handler_name = 'end_%s' % tag
         if hasattr(self.doc.style, handler_name):
             getattr(self.doc.style, handler_name)()
 
     def handle_data(self, data):
+        self._pending_data.append(data)
+
+    def _handle_pending_data(self):
+        if not self._pending_data:
+            return
+        data = ''.join(self._pending_data)
+        self._pending_data = []
         if data.isspace():
             data = ' '
         else:
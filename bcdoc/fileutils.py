@@ -0,0 +1,24 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+# How much of a file streamed into a document is read at a time.
+READ_SIZE = 64 * 1024
+
+
+def iter_file_chunks(f, size=READ_SIZE):
+    """Reads a file-like object a chunk at a time."""
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            break
+        yield chunk
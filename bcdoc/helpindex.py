@@ -0,0 +1,177 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Pre-rendered help pages packed into a single file.
+
+The file starts with a header holding the version it was built for,
+followed by the rendered pages, the sorted command paths and a table of
+fixed size entries pointing at both.  A footer at the end of the file
+locates the table so a page can be looked up with a binary search over
+a memory map of the file, without reading the rest of it.
+
+This module only uses the standard library so looking up help does not
+import docutils or any of the document generation code.
+"""
+import mmap
+import struct
+
+import six
+
+from bcdoc.compat import replace_file
+
+MAGIC = b'BCHELP01'
+_HEADER = struct.Struct('>8sH')
+# key offset, key length, page offset, page length
+_ENTRY = struct.Struct('>QIQQ')
+# keys offset, entries offset, number of entries, magic
+_FOOTER = struct.Struct('>QQI8s')
+
+
+class HelpIndexError(Exception):
+    pass
+
+
+def _get_key(command_path):
+    if not isinstance(command_path, six.string_types):
+        command_path = ' '.join(command_path)
+    return command_path.encode('utf-8')
+
+
+def write_help_index(filename, pages, version):
+    """Writes rendered help pages to a help index file.
+
+    :param filename: The file to write. It is replaced atomically.
+    :param pages: A dict or an iterable of ``(command_path, page)``
+        pairs.  A command path is a string or a list of command names and
+        a page is the rendered help as a string, as bytes or as a
+        callable returning either of them.
+    :param version: A string identifying what the pages were rendered
+        from.  Lookups for any other version are treated as stale.
+    """
+    if hasattr(pages, 'items'):
+        pages = pages.items()
+    version = version.encode('utf-8')
+    entries = []
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(version)))
+        f.write(version)
+        for command_path, page in pages:
+            if callable(page):
+                page = page()
+            if isinstance(page, six.text_type):
+                page = page.encode('utf-8')
+            entries.append([_get_key(command_path), f.tell(), len(page)])
+            f.write(page)
+        entries.sort()
+        keys_offset = f.tell()
+        key_offset = keys_offset
+        for entry in entries:
+            f.write(entry[0])
+            entry.append(key_offset)
+            key_offset += len(entry[0])
+        entries_offset = f.tell()
+        for key, page_offset, page_length, key_offset in entries:
+            f.write(_ENTRY.pack(key_offset, len(key), page_offset,
+                                page_length))
+        f.write(_FOOTER.pack(keys_offset, entries_offset, len(entries),
+                             MAGIC))
+    replace_file(temp_filename, filename)
+
+
+class HelpIndex(object):
+    """Looks up pages in a help index file through a memory map.
+
+    :param filename: The help index file.
+    :param version: The version the pages must have been built for.
+    :raises HelpIndexError: If the file is not a help index or was built
+        for a different version.
+    """
+
+    def __init__(self, filename, version):
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._check(version.encode('utf-8'))
+        except Exception:
+            self.close()
+            raise
+
+    def _check(self, version):
+        if len(self._map) < _HEADER.size + _FOOTER.size:
+            raise HelpIndexError('Not a help index')
+        magic, version_length = _HEADER.unpack_from(self._map, 0)
+        footer = _FOOTER.unpack_from(self._map,
+                                     len(self._map) - _FOOTER.size)
+        if magic != MAGIC or footer[3] != MAGIC:
+            raise HelpIndexError('Not a help index')
+        built_version = self._map[_HEADER.size:_HEADER.size + version_length]
+        if built_version != version:
+            raise HelpIndexError(
+                'Help index was built for version %r'
+                % built_version.decode('utf-8'))
+        self._entries_offset = footer[1]
+        self._count = footer[2]
+
+    def _get_entry(self, index):
+        return _ENTRY.unpack_from(
+            self._map, self._entries_offset + index * _ENTRY.size)
+
+    def get(self, command_path):
+        """Returns the rendered page of a command as bytes or None."""
+        key = _get_key(command_path)
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, page_offset, page_length = \
+                self._get_entry(middle)
+            entry_key = self._map[key_offset:key_offset + key_length]
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                return self._map[page_offset:page_offset + page_length]
+        return None
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def lookup_help(filename, command_path, version, render):
+    """Returns the help for a command, from the index when possible.
+
+    Falls back to calling ``render``, which should render the help live,
+    when the index is missing, stale or has no page for the command.
+
+    :rtype: bytes
+    """
+    try:
+        with HelpIndex(filename, version) as index:
+            page = index.get(command_path)
+    except (IOError, OSError, ValueError, HelpIndexError):
+        page = None
+    if page is None:
+        page = render()
+        if isinstance(page, six.text_type):
+            page = page.encode('utf-8')
+    return page
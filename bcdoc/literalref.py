@@ -0,0 +1,84 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import codecs
+
+import six
+
+from bcdoc.fileutils import READ_SIZE, iter_file_chunks
+
+
+class LiteralReference(object):
+    """The text of a literal block that is only read when it is flushed.
+
+    :param source: Where to read the text from.  Either the path of a
+        utf-8 encoded file, a buffer such as an mmap or a memoryview of
+        a region of one, a file-like object, or a callable returning a
+        string, bytes or an iterable of either.
+    :param indent: The indentation of every line but the first, which
+        is written already indented in front of the reference.
+    """
+
+    def __init__(self, source, indent=''):
+        self.source = source
+        self.indent = indent
+
+    def _iter_chunks(self):
+        source = self.source
+        if isinstance(source, six.string_types):
+            with open(source, 'rb') as f:
+                for chunk in iter_file_chunks(f):
+                    yield chunk
+            return
+        if callable(source):
+            source = source()
+            if isinstance(source, (six.text_type, six.binary_type)):
+                source = [source]
+        if hasattr(source, '__getitem__') and hasattr(source, '__len__') \
+                and not isinstance(source, (list, tuple)):
+            for start in range(0, len(source), READ_SIZE):
+                chunk = source[start:start + READ_SIZE]
+                if hasattr(chunk, 'tobytes'):
+                    chunk = chunk.tobytes()
+                yield chunk
+        elif hasattr(source, 'read'):
+            for chunk in iter_file_chunks(source):
+                yield chunk
+        else:
+            for chunk in source:
+                yield chunk
+
+    def iter_text(self):
+        """Reads the text and yields it indented, a chunk at a time."""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        at_line_start = False
+        for chunk in self._iter_chunks():
+            if isinstance(chunk, six.binary_type):
+                chunk = decoder.decode(chunk)
+            pieces = []
+            for i, line in enumerate(chunk.split('\n')):
+                if i:
+                    pieces.append('\n')
+                    at_line_start = True
+                if line:
+                    if at_line_start:
+                        pieces.append(self.indent)
+                    pieces.append(line)
+                    at_line_start = False
+            if pieces:
+                yield ''.join(pieces)
+        if not at_line_start:
+            yield '\n'
+
+    def getvalue(self):
+        """Returns the indented text as a whole."""
+        return ''.join(self.iter_text())
@@ -0,0 +1,132 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import re
+
+# Directives whose content is kept as is, like a literal block.
+LITERAL_DIRECTIVES = ('code', 'code-block', 'sourcecode', 'parsed-literal',
+                      'raw', 'math')
+_DIRECTIVE_RE = re.compile(br'^\s*\.\. ([\w:-]+)::')
+
+
+def _indentation(line):
+    return len(line) - len(line.lstrip(b' '))
+
+
+class WhitespaceNormalizer(object):
+    """Removes whitespace that does not change the meaning of ReST.
+
+    Runs of blank lines are collapsed into a single blank line, trailing
+    whitespace is stripped from each line and blank lines at the start
+    and end of the document are dropped.  Literal blocks, and the
+    content of directives that are literal, are left untouched apart
+    from the blank lines after them.
+
+    The normalizer works on utf-8 encoded bytes and can be fed a
+    document in chunks.  Only use it on whole documents, since dropping
+    the blank lines at the end of a part of a document could join it
+    with the next part.
+    """
+
+    def __init__(self):
+        self.bytes_saved = 0
+        self._partial = b''
+        # The length of the input taken in since output was last returned.
+        self._consumed = 0
+        self._blank_lines = []
+        self._started = False
+        # The indentation literal block lines have to be deeper than.
+        self._literal_indent = None
+        # The indentation of a line that may introduce a literal block.
+        self._literal_marker_indent = None
+        # Whether that line is a directive, whose options come before
+        # the literal content.
+        self._literal_directive = False
+
+    def normalize(self, data):
+        """Normalizes a whole document."""
+        return self.feed(data) + self.close()
+
+    def feed(self, data):
+        """Normalizes the next chunk of a document.
+
+        :returns: The normalized complete lines of the chunk.
+        """
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        output = []
+        for line in lines:
+            self._process_line(line, output)
+        return self._join(output)
+
+    def close(self):
+        """Normalizes the rest of the document once it has all been fed."""
+        output = []
+        if self._partial:
+            self._process_line(self._partial, output)
+            # The document did not end with a newline.
+            self._consumed -= 1
+            if output:
+                output[-1] = output[-1][:-1]
+        self._partial = b''
+        self._blank_lines = []
+        return self._join(output)
+
+    def _join(self, output):
+        value = b''.join(output)
+        self.bytes_saved += self._consumed - len(value)
+        self._consumed = 0
+        return value
+
+    def _process_line(self, line, output):
+        self._consumed += len(line) + 1
+        if not line.strip():
+            self._blank_lines.append(line)
+            return
+        indent = _indentation(line)
+        if self._literal_indent is not None:
+            if indent > self._literal_indent:
+                for blank_line in self._blank_lines:
+                    output.append(blank_line + b'\n')
+                self._blank_lines = []
+                output.append(line + b'\n')
+                return
+            self._literal_indent = None
+        if self._literal_marker_indent is not None:
+            if indent <= self._literal_marker_indent:
+                self._literal_marker_indent = None
+            elif self._blank_lines:
+                self._literal_indent = self._literal_marker_indent
+                self._literal_marker_indent = None
+            elif not self._literal_directive:
+                self._literal_marker_indent = None
+        if self._blank_lines and self._started:
+            output.append(b'\n')
+        self._blank_lines = []
+        self._started = True
+        if self._literal_indent is not None:
+            # The first line of a literal block.
+            output.append(line + b'\n')
+            return
+        stripped = line.rstrip()
+        if not stripped.endswith(b'\\'):
+            # A trailing backslash would escape the whitespace after it.
+            line = stripped
+        output.append(line + b'\n')
+        match = _DIRECTIVE_RE.match(line)
+        if match is not None:
+            if match.group(1).decode('ascii') in LITERAL_DIRECTIVES:
+                self._literal_marker_indent = indent
+                self._literal_directive = True
+        elif line.endswith(b'::'):
+            self._literal_marker_indent = indent
+            self._literal_directive = False
@@ -10,27 +10,188 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
+import hashlib
+import itertools
 import logging
+import os
+import sys
+import threading
+from collections import namedtuple
 
-from bcdoc.compat import OrderedDict
-from bcdoc.docstringparser import DocStringParser
+import six
+
+from bcdoc.compat import OrderedDict, replace_file
+from bcdoc.fileutils import iter_file_chunks
+from bcdoc.literalref import LiteralReference
 from bcdoc.style import ReSTStyle
+from bcdoc.writebuffer import WriteBuffer
 
 LOG = logging.getLogger('bcdocs')
 
+# The HTML doc string parser, spilling, the validator and the thread
+# pool are imported where they are used so that importing bcdoc stays
+# cheap for programs that rarely render any help.
+
+# Orders the checkpoints of every document structure by when they were
+# taken, and the sections by when they were created or last checkpointed.
+_checkpoint_generations = itertools.count(1)
+
+# A heading or API definition recorded for a table of contents. Levels
+# 1 to 3 are headings, classes are written at level 4 and methods at 5.
+TocEntry = namedtuple('TocEntry', ['path', 'level', 'kind', 'title'])
+
+
+class _TargetFork(object):
+    """Content written differently for each target of a document."""
+
+    def __init__(self, values):
+        self.values = values
+
+    # Style code amends the last write, so the string operations it
+    # uses are applied to the content of every target.
+    def __contains__(self, s):
+        return any(s in value for value in self.values.values())
+
+    def rstrip(self, chars=None):
+        return _TargetFork(
+            dict((target, value.rstrip(chars))
+                 for target, value in self.values.items()))
+
+    def replace(self, old, new):
+        return _TargetFork(
+            dict((target, value.replace(old, new))
+                 for target, value in self.values.items()))
+
+
+class _DeferredDocString(object):
+    """A doc string that is parsed when the document is flushed."""
+
+    def __init__(self, doc_string, state):
+        self.doc_string = doc_string
+        self.state = state
+
+
+class _JournaledDict(dict):
+    """A dict that can record its changes so they can be undone."""
+
+    _MISSING = object()
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        # The (key, previous value) of each change while journaling.
+        self.journal = None
+        # The marks handed out to everyone journaling the dict.
+        self._marks = []
+
+    def __setitem__(self, key, value):
+        if self.journal is not None:
+            self.journal.append((key, self.get(key, self._MISSING)))
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if self.journal is not None and key in self:
+            self.journal.append((key, self[key]))
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def start_journal(self):
+        """Starts journaling and returns a mark to undo changes to."""
+        if self.journal is None:
+            self.journal = []
+        mark = len(self.journal)
+        self._marks.append(mark)
+        return mark
+
+    def undo(self, mark):
+        """Undoes the changes journaled since the mark."""
+        # Changes a later mark can still undo are reverted by journaled
+        # changes instead, so undoing to that mark restores them.
+        later = max([m for m in self._marks if m > mark] or [mark])
+        while len(self.journal) > later:
+            key, value = self.journal.pop()
+            if value is self._MISSING:
+                dict.__delitem__(self, key)
+            else:
+                dict.__setitem__(self, key, value)
+        for key, value in reversed(self.journal[mark:later]):
+            if value is self._MISSING:
+                del self[key]
+            else:
+                self[key] = value
+
+    def end_journal(self, mark):
+        """Stops journaling for the user the mark was handed out to."""
+        self._marks.remove(mark)
+        if not self._marks:
+            self.journal = None
+
+
+class _Checkpoint(object):
+    """The state of a document to roll back to."""
+
+    def __init__(self, position, state, last_doc_string, toc_length):
+        self.position = position
+        # Writes from before the position that were removed since the
+        # checkpoint was created, in the order they were written.
+        self.tail = []
+        self.state = state
+        self.last_doc_string = last_doc_string
+        self.toc_length = toc_length
+        # Table of contents entries from before toc_length that were
+        # removed since the checkpoint was created.
+        self.toc_tail = []
+        # A journal mark when the hrefs can be journaled, otherwise a
+        # copy of them. Only the checkpoint a caller created has either.
+        self.hrefs_mark = None
+        self.hrefs = None
+
 
 class ReSTDocument(object):
 
-    def __init__(self, target='man'):
-        self.style = ReSTStyle(self)
+    def __init__(self, target='man', style_class=ReSTStyle, targets=None):
+        self.style = style_class(self)
+        if targets:
+            target = targets[0]
         self.target = target
-        self.parser = DocStringParser(self)
+        self.targets = targets
+        self._parser = None
         self.keep_data = True
         self.do_translation = False
         self.translation_map = {}
-        self.hrefs = {}
-        self._writes = []
+        self.hrefs = _JournaledDict()
+        # A LinkTargetRegistry to share link target definitions through.
+        self.link_registry = None
+        # A SearchIndex to add the text of the document to as it is written.
+        self.search_index = None
+        # When True, doc strings are only parsed when the document is
+        # flushed so doc strings that get removed are never parsed.
+        self.defer_doc_strings = False
+        self._writes = WriteBuffer()
         self._last_doc_string = None
+        self._toc_entries = []
+        self._checkpoints = []
+
+    @property
+    def parser(self):
+        """
+        The parser of the HTML in doc strings, created when first used.
+        """
+        if self._parser is None:
+            from bcdoc.docstringparser import DocStringParser
+            self._parser = DocStringParser(self)
+        return self._parser
+
+    @parser.setter
+    def parser(self, parser):
+        self._parser = parser
 
     def _write(self, s):
         if self.keep_data and s is not None:
@@ -48,18 +209,38 @@ class ReSTDocument(object):
         """
         self._write('%s%s\n' % (self.style.spaces(), content))
 
+    def writelines(self, lines):
+        """
+        Write each of the lines on a newline, in a single write.
+        """
+        if not isinstance(lines, list):
+            lines = list(lines)
+        if not lines:
+            return
+        prefix = self.style.spaces()
+        self._write(prefix + ('\n' + prefix).join(lines) + '\n')
+
     def peek_write(self):
         """
         Returns the last content written to the document without
         removing it from the stack.
         """
-        return self._writes[-1]
+        self._parse_last_deferred_doc_string()
+        return self._writes.peek()
 
     def pop_write(self):
         """
         Removes and returns the last content written to the stack.
         """
-        return self._writes.pop()
+        self._parse_last_deferred_doc_string()
+        write = self._writes.pop()
+        if self._checkpoints:
+            start = self._writes.tell()
+            for checkpoint in self._checkpoints:
+                if checkpoint.position > start:
+                    checkpoint.tail.insert(0, write)
+                    checkpoint.position = start
+        return write
 
     def push_write(self, s):
         """
@@ -67,43 +248,365 @@ class ReSTDocument(object):
         """
         self._writes.append(s)
 
-    def getvalue(self):
+    def write_for_targets(self, write_func):
+        """
+        Calls write_func once for each target of the document.
+
+        The content written for each target is recorded separately and
+        is only kept apart from the rest of the document when it
+        actually differs between the targets.
+        """
+        self._track_checkpoints()
+        targets = self.targets
+        original_target = self.target
+        writes = self._writes
+        checkpoints = self._checkpoints
+        values = {}
+        # Target dependent calls made by write_func write directly. The
+        # checkpoints refer to positions in the document's own writes,
+        # so they are left alone while writing to a temporary buffer.
+        self.targets = None
+        self._checkpoints = []
+        try:
+            for target in targets:
+                self.target = target
+                self._writes = WriteBuffer()
+                write_func()
+                values[target] = ''.join(self._writes)
+        finally:
+            self.targets = targets
+            self.target = original_target
+            self._writes = writes
+            self._checkpoints = checkpoints
+        if len(set(values.values())) == 1:
+            self._write(values[original_target])
+        else:
+            self._write(_TargetFork(values))
+
+    def _resolve_writes(self, target=None):
+        if target is None:
+            target = self.target
+        for write in self._writes:
+            if isinstance(write, _TargetFork):
+                write = write.values[target]
+            elif isinstance(write, LiteralReference):
+                write = write.getvalue()
+            yield write
+
+    def getvalue(self, target=None, normalizer=None):
         """
         Returns the current content of the document as a string.
+
+        :param normalizer: A ``WhitespaceNormalizer`` to remove redundant
+            whitespace from the content with. Its ``bytes_saved`` tells
+            how much was removed.
+        """
+        self._parse_deferred_doc_strings()
+        self._write_link_targets()
+        value = self.style.join_writes(
+            self._resolve_writes(target)).encode('utf-8')
+        if normalizer is not None:
+            value = normalizer.normalize(value)
+        return value
+
+    def _write_link_targets(self):
+        if not self.hrefs:
+            return
+        hrefs = list(self.hrefs.items())
+        include = False
+        if self.link_registry is not None:
+            registered = [self.link_registry.register(refname, link)
+                          for refname, link in hrefs]
+            # The registry's file also defines the names of targets that
+            # conflict with the document's, so it is only included when
+            # it defines every target of the document.
+            include = all(registered)
+        self.style.new_paragraph()
+        if include:
+            self.style.include(self.link_registry.include_path)
+            return
+        for refname, link in hrefs:
+            self.style.link_target_definition(refname, link)
+
+    def add_toc_entry(self, title, level, kind='heading'):
+        """
+        Records a heading for the document's table of contents.
+        """
+        self._track_checkpoints()
+        self._toc_entries.append(
+            TocEntry(self._section_path(), level, kind, title))
+        if self.search_index is not None:
+            self.search_index.add_text(self._section_path(), title)
+
+    def _section_path(self):
+        return ()
+
+    def _iter_toc_entries(self):
+        return iter(self._toc_entries)
+
+    def toc_tree(self, max_level=None):
+        """
+        Returns the recorded headings as a table of contents.
+
+        :param max_level: The deepest level of heading to include.
+        :rtype: list
+        :returns: A dict for each top level entry with its ``title``,
+            ``level``, ``kind``, ``path`` and the list of its
+            ``children``, in the order they appear in the document.
         """
-        if self.hrefs:
-            self.style.new_paragraph()
-            for refname, link in self.hrefs.items():
-                self.style.link_target_definition(refname, link)
-        return ''.join(self._writes).encode('utf-8')
+        tree = []
+        parents = []
+        for entry in self._iter_toc_entries():
+            if max_level is not None and entry.level > max_level:
+                continue
+            while parents and parents[-1]['level'] >= entry.level:
+                parents.pop()
+            node = {'title': entry.title, 'level': entry.level,
+                    'kind': entry.kind, 'path': entry.path,
+                    'children': []}
+            if parents:
+                parents[-1]['children'].append(node)
+            else:
+                tree.append(node)
+            parents.append(node)
+        return tree
 
     def translate_words(self, words):
         return [self.translation_map.get(w, w) for w in words]
 
     def handle_data(self, data):
         if data and self.keep_data:
-            self._write(data)
+            self._write(self.style.escape(data))
+            if self.search_index is not None:
+                self.search_index.add_text(self._section_path(), data)
 
     def include_doc_string(self, doc_string):
-        if doc_string:
+        """
+        Writes an HTML doc string to the document as ReST.
+
+        :param doc_string: The doc string as a string, an iterable of
+            string chunks or a file-like object.  Chunks and files are
+            fed to the parser as they are read, so a large doc string
+            never has to be held in memory as a whole.  They are parsed
+            right away even when doc strings are deferred.
+        """
+        self._track_checkpoints()
+        if doc_string and not isinstance(doc_string, six.string_types):
+            self._include_doc_string_chunks(doc_string)
+        elif doc_string:
+            if self.defer_doc_strings:
+                start = self._writes.tell()
+                self.push_write(_DeferredDocString(
+                    doc_string, self._get_doc_string_state()))
+                self._last_doc_string = (start, start + 1)
+                return
             try:
-                start = len(self._writes)
+                start = self._writes.tell()
                 self.parser.feed(doc_string)
-                end = len(self._writes)
+                end = self._writes.tell()
                 self._last_doc_string = (start, end)
             except Exception:
-                LOG.debug('Error parsing doc string', exc_info=True)
-                LOG.debug(doc_string)
+                _log_parse_error(doc_string)
+
+    def _include_doc_string_chunks(self, doc_string):
+        if hasattr(doc_string, 'read'):
+            doc_string = iter_file_chunks(doc_string)
+        elif isinstance(doc_string, six.binary_type):
+            doc_string = [doc_string]
+        try:
+            start = self._writes.tell()
+            self.parser.feed_chunks(doc_string)
+            end = self._writes.tell()
+            self._last_doc_string = (start, end)
+        except Exception:
+            _log_parse_error(doc_string)
+
+    def _get_doc_string_state(self):
+        return (self.style.indentation, getattr(self.style, 'do_p', None),
+                self.do_translation, self.keep_data)
+
+    def _set_doc_string_state(self, state):
+        indentation, do_p, self.do_translation, self.keep_data = state
+        self.style.indentation = indentation
+        if do_p is not None:
+            self.style.do_p = do_p
+
+    def _parse_last_deferred_doc_string(self):
+        # Style code amending the last write has to see what a deferred
+        # doc string writes, not the placeholder for it.
+        try:
+            last_write = self._writes.peek()
+        except IndexError:
+            return
+        if isinstance(last_write, _DeferredDocString):
+            self._parse_deferred_doc_strings()
+
+    def _parse_deferred_doc_strings(self):
+        for position, write in enumerate(self._writes.iter_writes()):
+            if isinstance(write, _DeferredDocString):
+                break
+        else:
+            return
+        # Everything from the first deferred doc string on is rewritten.
+        self._track_checkpoints()
+        self._truncate_checkpoints(position)
+        writes = self._writes
+        state = self._get_doc_string_state()
+        parsed_writes = WriteBuffer()
+        # The old position of each placeholder and the span its doc
+        # string was parsed into, to move the last doc string's span.
+        expanded = []
+        try:
+            for position, write in enumerate(writes.iter_writes()):
+                if not isinstance(write, _DeferredDocString):
+                    parsed_writes.append(write)
+                    continue
+                # Parse the doc string with the style state it was
+                # included with, after the writes before it so style
+                # code amending them sees the same writes it would have
+                # when the doc string was included.
+                self._set_doc_string_state(write.state)
+                self._writes = parsed_writes
+                start = parsed_writes.tell()
+                try:
+                    self.parser.feed(write.doc_string)
+                except Exception:
+                    _log_parse_error(write.doc_string)
+                expanded.append((position, start, parsed_writes.tell()))
+        finally:
+            self._set_doc_string_state(state)
+            self._writes = writes
+        self._writes = parsed_writes
+        if self._last_doc_string is not None:
+            self._last_doc_string = _move_span(
+                self._last_doc_string, expanded)
 
     def remove_last_doc_string(self):
         # Removes all writes inserted by last doc string
         if self._last_doc_string is not None:
             start, end = self._last_doc_string
-            del self._writes[start:end]
+            self._truncate_checkpoints(start)
+            self._writes.delete(start, end)
+
+    def checkpoint(self):
+        """
+        Marks the current state of the document to roll back to.
+
+        Checkpoints can be nested. Rolling back to a checkpoint, or
+        committing it, also ends every checkpoint created after it.
+
+        :returns: The checkpoint to pass to ``rollback`` or ``commit``.
+        """
+        checkpoint = self._push_checkpoint()
+        if isinstance(self.hrefs, _JournaledDict):
+            checkpoint.hrefs_mark = self.hrefs.start_journal()
+        else:
+            checkpoint.hrefs = dict(self.hrefs)
+        return checkpoint
+
+    def rollback(self, checkpoint):
+        """
+        Undoes everything written to the document since the checkpoint.
+
+        The writes, link targets and style state such as the indentation
+        are restored, in time proportional to what is undone.
+        """
+        self._end_checkpoint(checkpoint, rollback=True)
+
+    def commit(self, checkpoint):
+        """
+        Keeps everything written since the checkpoint and ends it.
+        """
+        self._end_checkpoint(checkpoint, rollback=False)
+
+    def _track_checkpoints(self):
+        # Called before the document changes. A document's checkpoints
+        # are all taken when ``checkpoint`` is called, but a document
+        # structure only checkpoints a section once it is about to change.
+        pass
+
+    def _push_checkpoint(self):
+        checkpoint = _Checkpoint(
+            self._writes.tell(), self._get_doc_string_state(),
+            self._last_doc_string, len(self._toc_entries))
+        self._checkpoints.append(checkpoint)
+        return checkpoint
+
+    def _end_checkpoint(self, checkpoint, rollback, strict=True):
+        for index, active in enumerate(self._checkpoints):
+            if active is checkpoint:
+                break
+        else:
+            if strict:
+                raise ValueError('The checkpoint is no longer active')
+            return
+        if rollback:
+            self._track_checkpoints()
+        ended = []
+        kept = []
+        for active in self._checkpoints[index + 1:]:
+            if self._ends_with(checkpoint, active):
+                ended.append(active)
+            else:
+                kept.append(active)
+        self._checkpoints[index:] = kept
+        if rollback:
+            # What the ended checkpoints would undo is undone anyway.
+            for active in ended:
+                self._end_hrefs_journal(active)
+            self._restore_checkpoint(checkpoint)
+        for active in reversed(ended):
+            self._release_checkpoint(active, rollback=False)
+        self._release_checkpoint(checkpoint, rollback)
+
+    def _ends_with(self, checkpoint, later):
+        # Whether a checkpoint created after the one being ended is
+        # ended along with it.
+        return True
+
+    def _restore_checkpoint(self, checkpoint):
+        # The checkpoints kept active still restore what is undone.
+        self._truncate_checkpoints(checkpoint.position)
+        toc = self._toc_entries
+        for active in self._checkpoints:
+            if active.toc_length > checkpoint.toc_length:
+                active.toc_tail[:0] = toc[
+                    checkpoint.toc_length:active.toc_length]
+                active.toc_length = checkpoint.toc_length
+        self._writes.delete(checkpoint.position, self._writes.tell())
+        for write in checkpoint.tail:
+            self._writes.append(write)
+        self._set_doc_string_state(checkpoint.state)
+        self._last_doc_string = checkpoint.last_doc_string
+        del toc[checkpoint.toc_length:]
+        toc.extend(checkpoint.toc_tail)
+        if checkpoint.hrefs_mark is not None:
+            self.hrefs.undo(checkpoint.hrefs_mark)
+        elif checkpoint.hrefs is not None:
+            self.hrefs.clear()
+            self.hrefs.update(checkpoint.hrefs)
+
+    def _release_checkpoint(self, checkpoint, rollback):
+        self._end_hrefs_journal(checkpoint)
+
+    def _end_hrefs_journal(self, checkpoint):
+        if checkpoint.hrefs_mark is not None:
+            self.hrefs.end_journal(checkpoint.hrefs_mark)
+            checkpoint.hrefs_mark = None
+
+    def _truncate_checkpoints(self, position):
+        # Moves checkpoints after a position that is about to be changed
+        # back to it, keeping what they need to restore the content.
+        for checkpoint in self._checkpoints:
+            if checkpoint.position > position:
+                checkpoint.tail[:0] = self._writes.slice(
+                    position, checkpoint.position)
+                checkpoint.position = position
 
 
 class DocumentStructure(ReSTDocument):
-    def __init__(self, name, section_names=None, target='man'):
+    def __init__(self, name, section_names=None, target='man',
+                 style_class=ReSTStyle, targets=None):
         """Provides a Hierarichial structure to a ReSTDocument
 
         You can write to it similiar to as you can to a ReSTDocument but
@@ -113,11 +616,51 @@ class DocumentStructure(ReSTDocument):
         :param section_names: A list of sections to be included
             in the document.
         :parma target: The target documentation of the Document structure
+        :param style_class: The style used to write the document
+        :param targets: A list of targets to write the document for in a
+            single pass. When given, ``target`` is the first of them.
         """
-        super(DocumentStructure, self).__init__(target=target)
+        super(DocumentStructure, self).__init__(
+            target=target, style_class=style_class, targets=targets)
         self._name = name
         self._structure = OrderedDict()
-        self._path = [self._name]
+        # A section only knows its parent and name. Its path is derived
+        # from them. The index of every section in the tree, shared by
+        # the root, keys each by its parent's key and its name.
+        self._parent = None
+        # The path of a section without a parent when it was set to
+        # something other than its name.
+        self._root_path = None
+        # The path as a list, once it was asked for.
+        self._path = None
+        # The key of this section in the path index.
+        self._key = _index_key((name,))
+        self._path_index = {self._key: self}
+        self.spill_file = None
+        # The segments of the spill file holding this section's content
+        # keyed by target, once the section is marked complete.
+        self._spilled = None
+        # The checkpoints taken on any section of the tree, in the order
+        # they were taken, shared by every section of the tree.
+        self._tree_checkpoints = []
+        # The generation of the last checkpoint the section was
+        # checkpointed for. A section created after a checkpoint is
+        # removed when rolling back to it so it never needs one.
+        self._checkpoint_generation = next(_checkpoint_generations)
+        # The (name, previous section, position) of each section added,
+        # replaced or deleted while the section has checkpoints.
+        self._structure_journal = []
+        # Digests of the section keyed by target. They are cleared,
+        # along with those of the parents, whenever the section changes.
+        self._digests = {}
+        # The indentation the section was added at, and how many levels
+        # its content is shifted by when flushed, for cloned sections.
+        self._base_indentation = 0
+        self._reindent = 0
+        self._spilled_reindent = 0
+        # The function that writes a lazy section when it is first
+        # flushed.
+        self._render = None
         if section_names is not None:
             self._generate_structure(section_names)
 
@@ -132,11 +675,127 @@ class DocumentStructure(ReSTDocument):
         A list of where to find a particular document structure in the
         overlying document structure.
         """
+        if self._path is None:
+            self._path = list(self._path_key)
         return self._path
 
     @path.setter
     def path(self, value):
-        self._path = value
+        if self._parent is not None:
+            raise ValueError('The path of section %s is derived from its '
+                             'parent and cannot be set' % self._name)
+        self._root_path = tuple(value)
+        self._path_index.clear()
+        for key, section in self._iter_index():
+            section._path = None
+            section._key = key
+            self._path_index[key] = section
+
+    @property
+    def _path_key(self):
+        names = []
+        section = self
+        while section._parent is not None:
+            names.append(section._name)
+            section = section._parent
+        path = section._root_path or (section._name,)
+        if names:
+            names.reverse()
+            path += tuple(names)
+        return path
+
+    def get_section_by_path(self, path):
+        """Retrieve any section in the tree by its full path
+
+        The lookup is a single dict lookup in an index shared by every
+        section of the tree, however deep the section is.
+
+        :param path: The path of the section, starting with the name of
+            the root, as a list or tuple.
+        :raises KeyError: If there is no section with the path.
+        """
+        return self._path_index[_index_key(path)]
+
+    def get_sections_by_prefix(self, prefix=None):
+        """Iterates over a section and every section under it
+
+        :param prefix: The full path of the section to start from.
+            Defaults to this document structure.
+        :returns: An iterator of ``(path, section)`` pairs in document
+            order, where the path is a tuple.
+        """
+        if prefix is None:
+            section = self
+        else:
+            section = self.get_section_by_path(prefix)
+        return section._iter_subtree()
+
+    def _iter_subtree(self, path=None):
+        if path is None:
+            path = self._path_key
+        yield path, self
+        for name, section in self._structure.items():
+            for item in section._iter_subtree(path + (name,)):
+                yield item
+
+    def _iter_index(self, key=None):
+        # Like _iter_subtree, with the keys of the sections in the path
+        # index in place of their paths.
+        if key is None:
+            if self._parent is None:
+                key = _index_key(self._path_key)
+            else:
+                key = (self._parent._key, self._name)
+        yield key, self
+        for name, section in self._structure.items():
+            for item in section._iter_index((key, name)):
+                yield item
+
+    def _set_section(self, name, section):
+        self._track_checkpoints()
+        previous = self._structure.get(name)
+        if previous is not None:
+            self._detach_section(previous)
+        if self._checkpoints:
+            self._structure_journal.append((name, previous, None))
+        self._structure[name] = section
+        self._attach_section(section)
+
+    def _attach_section(self, section):
+        section._parent = self
+        checkpoints = section._tree_checkpoints
+        if checkpoints is not self._tree_checkpoints and checkpoints:
+            self._tree_checkpoints.extend(checkpoints)
+            self._tree_checkpoints.sort(key=lambda c: c.generation)
+        for key, subsection in section._iter_index():
+            subsection._path_index = self._path_index
+            subsection._tree_checkpoints = self._tree_checkpoints
+            subsection._path = None
+            subsection._key = key
+            self._path_index[key] = subsection
+
+    def _detach_section(self, section):
+        # A detached section becomes the root of an index of its own so
+        # anything added to it later stays out of this tree's index. It
+        # is checkpointed first since it can still be restored by
+        # rolling back, and takes the checkpoints taken on it along.
+        for key, subsection in section._iter_index():
+            subsection._track_checkpoints()
+            if self._path_index.get(key) is subsection:
+                del self._path_index[key]
+        section._parent = None
+        index = {}
+        checkpoints = []
+        for key, subsection in section._iter_index():
+            subsection._path_index = index
+            subsection._tree_checkpoints = checkpoints
+            subsection._path = None
+            subsection._key = key
+            index[key] = subsection
+        for checkpoint in list(self._tree_checkpoints):
+            if checkpoint.owner._tree_checkpoints is checkpoints:
+                self._tree_checkpoints.remove(checkpoint)
+                checkpoints.append(checkpoint)
 
     @property
     def available_sections(self):
@@ -160,40 +819,831 @@ class DocumentStructure(ReSTDocument):
             to the document structure it was instantiated from.
         """
         # Add a new section
-        section = self.__class__(name=name, target=self.target)
-        section.path = self.path + [name]
+        section = self.__class__(name=name, target=self.target,
+                                 style_class=self.style.__class__,
+                                 targets=self.targets)
         # Indent the section apporpriately as well
         section.style.indentation = self.style.indentation
+        section._base_indentation = self.style.indentation
+        section._reindent = self._reindent
         section.translation_map = self.translation_map
         section.hrefs = self.hrefs
-        self._structure[name] = section
+        section.link_registry = self.link_registry
+        section.search_index = self.search_index
+        section.defer_doc_strings = self.defer_doc_strings
+        section.spill_file = self.spill_file
+        self._set_section(name, section)
+        self._invalidate_digests()
         return section
 
+    def add_lazy_section(self, name, render):
+        """Adds a section that is only written when it is flushed
+
+        :param name: The name of the section.
+        :param render: A function called with the new section the first
+            time it is flushed, which writes the section.  It may return
+            an awaitable, in which case the section can only be flushed
+            with ``aflush``.
+        :rtype: DocumentStructure
+        :returns: The new section.
+        """
+        section = self.add_new_section(name)
+        section._render = render
+        return section
+
+    def _call_render(self):
+        render, self._render = self._render, None
+        return render(self)
+
+    def _parse_deferred_doc_strings(self):
+        if self._render is not None:
+            result = self._call_render()
+            if hasattr(result, '__await__'):
+                # Nothing is written until the awaitable is awaited, so
+                # it is kept for aflush to await later.
+                self._render = lambda section: result
+                raise ValueError('Section %s is written asynchronously and '
+                                 'can only be flushed with aflush'
+                                 % '.'.join(self._path_key))
+        super(DocumentStructure, self)._parse_deferred_doc_strings()
+
+    def add_cloned_section(self, name, section):
+        """Adds a copy of an already written section and its subsections
+
+        The copy is placed at the current indentation of this document
+        structure instead of the indentation the section was written at.
+        The content is re-indented when the copy is flushed and the
+        writes are shared with the original section until either of
+        them is changed, so cloning costs neither the time to write the
+        section again nor the memory to hold another copy of it.
+
+        Anything written to the copy afterwards is written at the
+        indentation of the original and re-indented along with the rest
+        of its content. The link targets of the original document are
+        added to this one.
+
+        :param name: The name of the copy.
+        :param section: The document structure to copy.
+        :rtype: DocumentStructure
+        :returns: The copy.
+        """
+        section._parse_all_deferred_doc_strings()
+        if section.hrefs is not self.hrefs:
+            for refname, link in section.hrefs.items():
+                self.hrefs.setdefault(refname, link)
+        levels = self.style.indentation - section._base_indentation
+        clone = section._clone(name, self, levels)
+        self._set_section(name, clone)
+        self._invalidate_digests()
+        return clone
+
+    def _clone(self, name, parent, levels):
+        clone = self.__class__(name=name, target=self.target,
+                               style_class=self.style.__class__,
+                               targets=self.targets)
+        clone.translation_map = parent.translation_map
+        clone.hrefs = parent.hrefs
+        clone.link_registry = parent.link_registry
+        clone.search_index = parent.search_index
+        clone.defer_doc_strings = parent.defer_doc_strings
+        clone.spill_file = parent.spill_file
+        clone._parent = parent
+        clone._set_doc_string_state(self._get_doc_string_state())
+        clone._base_indentation = self._base_indentation
+        clone._reindent = self._reindent + levels
+        clone._writes = self._writes.share()
+        clone._last_doc_string = self._last_doc_string
+        clone._spilled = self._spilled
+        clone._spilled_reindent = self._spilled_reindent + levels
+        path_length = len(self._path_key)
+        clone._toc_entries = [
+            entry._replace(path=clone._path_key + entry.path[path_length:])
+            for entry in self._toc_entries]
+        for section_name, section in self._structure.items():
+            clone._structure[section_name] = section._clone(
+                section_name, clone, levels)
+        return clone
+
     def get_section(self, name):
         """Retrieve a section"""
         return self._structure[name]
 
     def delete_section(self, name):
         """Delete a section"""
-        del self._structure[name]
+        self._track_checkpoints()
+        if self._checkpoints:
+            position = list(self._structure).index(name)
+            self._structure_journal.append(
+                (name, self._structure[name], position))
+        self._detach_section(self._structure.pop(name))
+        self._invalidate_digests()
+
+    def _write(self, s):
+        if self.keep_data and s is not None:
+            if self._tree_checkpoints:
+                self._track_checkpoints()
+            self._writes = self._writes.unshared()
+            self._writes.append(s)
+            if self._digests:
+                self._invalidate_digests()
+
+    def pop_write(self):
+        self._track_checkpoints()
+        self._invalidate_digests()
+        self._writes = self._writes.unshared()
+        return super(DocumentStructure, self).pop_write()
+
+    def push_write(self, s):
+        self._track_checkpoints()
+        self._invalidate_digests()
+        self._writes = self._writes.unshared()
+        super(DocumentStructure, self).push_write(s)
+
+    def remove_last_doc_string(self):
+        self._track_checkpoints()
+        self._invalidate_digests()
+        self._writes = self._writes.unshared()
+        super(DocumentStructure, self).remove_last_doc_string()
+
+    def checkpoint(self):
+        # The sections under this one are not checkpointed yet. Each of
+        # them is checkpointed the first time it changes afterwards, and
+        # the checkpoint is added to the children of this one. Ending it
+        # only ends the checkpoints taken later on this section and the
+        # sections under it, not those taken on the sections above.
+        self._track_checkpoints()
+        checkpoint = super(DocumentStructure, self).checkpoint()
+        checkpoint.generation = next(_checkpoint_generations)
+        checkpoint.owner = self
+        checkpoint.children = []
+        self._checkpoint_generation = checkpoint.generation
+        self._tree_checkpoints.append(checkpoint)
+        return checkpoint
+
+    def _track_checkpoints(self):
+        checkpoints = self._tree_checkpoints
+        if (not checkpoints or
+                checkpoints[-1].generation <= self._checkpoint_generation):
+            return
+        generation = self._checkpoint_generation
+        self._checkpoint_generation = checkpoints[-1].generation
+        for checkpoint in checkpoints:
+            if (checkpoint.generation > generation and
+                    self._is_under(checkpoint.owner)):
+                child = self._push_checkpoint()
+                child.owner = checkpoint.owner
+                checkpoint.children.append((self, child))
+
+    def _is_under(self, section):
+        parent = self._parent
+        while parent is not None:
+            if parent is section:
+                return True
+            parent = parent._parent
+        return False
+
+    def _push_checkpoint(self):
+        checkpoint = super(DocumentStructure, self)._push_checkpoint()
+        checkpoint.structure_mark = len(self._structure_journal)
+        # The sections to restore after undoing the journal, once
+        # rolling back an earlier checkpoint undid more than that.
+        checkpoint.structure = None
+        checkpoint.children = None
+        return checkpoint
+
+    def _ends_with(self, checkpoint, later):
+        # A checkpoint taken later on a section above the owner of the
+        # one being ended is only ended when that section rolls back.
+        return (later.owner is checkpoint.owner or
+                later.owner._is_under(checkpoint.owner))
+
+    def _restore_checkpoint(self, checkpoint):
+        self._writes = self._writes.unshared()
+        super(DocumentStructure, self)._restore_checkpoint(checkpoint)
+        if checkpoint.children is not None:
+            for section, child in reversed(checkpoint.children):
+                section._end_checkpoint(child, rollback=True, strict=False)
+        journal = self._structure_journal
+        mark = checkpoint.structure_mark
+        kept = [active for active in self._checkpoints
+                if active.structure_mark > mark]
+        while len(journal) > mark:
+            for active in kept:
+                if (active.structure is None and
+                        active.structure_mark == len(journal)):
+                    active.structure = list(self._structure.items())
+            self._undo_structure_change(*journal.pop())
+        for active in kept:
+            active.structure_mark = mark
+        if checkpoint.structure is not None:
+            if self._checkpoints:
+                journal.append((None, list(self._structure.items()), None))
+            self._replace_structure(checkpoint.structure)
+        self._invalidate_digests()
+
+    def _undo_structure_change(self, name, previous, position):
+        if name is None:
+            # The whole structure was replaced by rolling back.
+            self._replace_structure(previous)
+            return
+        current = self._structure.get(name)
+        if current is not None:
+            self._detach_section(current)
+            if previous is None:
+                del self._structure[name]
+        if previous is None:
+            return
+        if position is None or position == len(self._structure):
+            self._structure[name] = previous
+        else:
+            sections = list(self._structure.items())
+            sections.insert(position, (name, previous))
+            self._structure.clear()
+            self._structure.update(sections)
+        self._attach_section(previous)
+
+    def _replace_structure(self, sections):
+        current = list(self._structure.values())
+        for section in current:
+            if not any(section is s for _, s in sections):
+                self._detach_section(section)
+        self._structure.clear()
+        self._structure.update(sections)
+        for _, section in sections:
+            if not any(section is s for s in current):
+                self._attach_section(section)
+
+    def _release_checkpoint(self, checkpoint, rollback):
+        super(DocumentStructure, self)._release_checkpoint(
+            checkpoint, rollback)
+        if checkpoint.children is not None:
+            checkpoints = checkpoint.owner._tree_checkpoints
+            for index, active in enumerate(checkpoints):
+                if active is checkpoint:
+                    del checkpoints[index]
+                    break
+            if not rollback:
+                for section, child in checkpoint.children:
+                    section._end_checkpoint(
+                        child, rollback=False, strict=False)
+        if not self._checkpoints:
+            del self._structure_journal[:]
+
+    def _invalidate_digests(self):
+        # A parent's digest is only ever computed from the digests of its
+        # sections, so once a section without digests is reached none of
+        # its parents can have any either.
+        section = self
+        while section is not None and section._digests:
+            section._digests = {}
+            section = section._parent
+
+    def digest(self, target=None):
+        """Returns a digest of the section and all of its subsections
+
+        The digest is computed from the section's own content and the
+        names and digests of its subsections.  It is cached until the
+        section or one of its subsections changes, so only the sections
+        that changed are hashed again.
+
+        :rtype: str
+        :returns: The hex digest.
+        """
+        target = target or self.target
+        digest = self._digests.get(target)
+        if digest is None:
+            sha = hashlib.sha256(b''.join(self._iter_value(target)))
+            for name, section in self._structure.items():
+                sha.update(('\0%s\0%s' % (
+                    name, section.digest(target))).encode('utf-8'))
+            digest = sha.hexdigest()
+            self._digests[target] = digest
+        return digest
+
+    def digest_manifest(self, target=None):
+        """Returns the digests of a doc structure as a nested dict
+
+        The manifest can be saved as JSON and compared against later
+        with ``changed_sections``.
+        """
+        sections = OrderedDict()
+        for name, section in self._structure.items():
+            sections[name] = section.digest_manifest(target)
+        return {'digest': self.digest(target), 'sections': sections}
 
-    def flush_structure(self):
+    def changed_sections(self, other, target=None):
+        """Lists the sections whose digests differ from another tree
+
+        Subtrees with matching digests are skipped without being looked
+        at, so the cost depends on how much changed.
+
+        :param other: Another DocumentStructure or a manifest returned by
+            ``digest_manifest``.
+        :rtype: list
+        :returns: The paths, as tuples, of the sections that changed
+            including those only present in one of the trees.
+        """
+        changed = []
+        self._add_changed_sections(other, target, changed, self._path_key)
+        return changed
+
+    def _add_changed_sections(self, other, target, changed, path):
+        if isinstance(other, DocumentStructure):
+            other_digest = other.digest(target)
+            other_sections = other._structure
+        else:
+            other_digest = other['digest']
+            other_sections = other['sections']
+        if self.digest(target) == other_digest:
+            return
+        changed.append(path)
+        for name, section in self._structure.items():
+            if name in other_sections:
+                section._add_changed_sections(
+                    other_sections[name], target, changed, path + (name,))
+            else:
+                changed.extend(
+                    item[0] for item in section._iter_subtree(path + (name,)))
+        for name in other_sections:
+            if name not in self._structure:
+                changed.append(path + (name,))
+
+    def enable_spilling(self, memory_limit=None):
+        """Spills the content of completed sections out of the document
+
+        Once enabled, sections marked with ``mark_complete`` have their
+        flushed content moved to a spill file that stays in memory until
+        it grows over ``memory_limit`` bytes and is then moved to a
+        temporary file on disk.
+
+        :param memory_limit: The number of bytes the spilled content may
+            take up in memory. Defaults to
+            ``bcdoc.spill.DEFAULT_MEMORY_LIMIT``.
+        """
+        from bcdoc.spill import SpillFile, DEFAULT_MEMORY_LIMIT
+        if memory_limit is None:
+            memory_limit = DEFAULT_MEMORY_LIMIT
+        self._set_spill_file(SpillFile(memory_limit))
+
+    def _set_spill_file(self, spill_file):
+        self.spill_file = spill_file
+        for section in self._structure.values():
+            section._set_spill_file(spill_file)
+
+    def mark_complete(self):
+        """Marks a section and all of its subsections as written
+
+        If spilling is enabled, the flushed content of the section is
+        moved to the spill file and the section and its subsections are
+        emptied. Nothing more should be written to a completed section.
+        """
+        if self.spill_file is None:
+            return
+        self._track_checkpoints()
+        if self._checkpoints:
+            raise ValueError('A section cannot be completed while it has '
+                             'an active checkpoint')
+        self._parse_all_deferred_doc_strings()
+        spilled = {}
+        digests = {}
+        for target in self.targets or [self.target]:
+            spilled[target] = self.spill_file.write(
+                b''.join(self._iter_flush(target)))
+            digests[target] = self.digest(target)
+        self._spilled = spilled
+        # The spilled content was flushed already re-indented.
+        self._spilled_reindent = 0
+        self._writes = WriteBuffer()
+        self._toc_entries = list(self._iter_toc_entries())
+        for section in self._structure.values():
+            self._detach_section(section)
+        self._structure.clear()
+        # The content is unchanged so keep the digests it had before its
+        # subsections were folded into it.
+        self._digests = digests
+
+    def flush_structure(self, target=None, normalizer=None):
         """Flushes a doc structure to a ReSTructed string
 
         The document is flushed out in a DFS style where sections and their
         subsections' values are added to the string as they are visited.
+
+        :param target: The target to flush when the document was written
+            for several targets. Defaults to the document's target.
+        :param normalizer: A ``WhitespaceNormalizer`` to remove redundant
+            whitespace from the flushed document with.
+        """
+        return b''.join(self.iter_structure(target, normalizer))
+
+    def iter_structure(self, target=None, normalizer=None):
+        """Flushes a doc structure as an iterator of encoded chunks
+
+        The chunks are produced in the same order as ``flush_structure``
+        would join them, without the whole document having to be held
+        in memory at once.
+
+        :param target: The target to flush when the document was written
+            for several targets. Defaults to the document's target.
+        :param normalizer: A ``WhitespaceNormalizer`` to remove redundant
+            whitespace from the flushed document with.
         """
         # We are at the root flush the links at the beginning of the
         # document
-        if len(self.path) == 1:
-            if self.hrefs:
-                self.style.new_paragraph()
-                for refname, link in self.hrefs.items():
-                    self.style.link_target_definition(refname, link)
-        value = self.getvalue()
+        if len(self._path_key) == 1:
+            # Deferred doc strings can add links so parse them first.
+            self._parse_all_deferred_doc_strings()
+            self._write_link_targets()
+        chunks = self._iter_flush(target)
+        if normalizer is not None:
+            chunks = self._iter_normalized(chunks, normalizer)
+        return chunks
+
+    def aflush(self, target=None, normalizer=None):
+        """Flushes a doc structure as an asynchronous iterator of chunks
+
+        The chunks are the same as those of ``iter_structure``, but
+        control is handed back to the event loop between sections and
+        the awaitables returned by the render functions of lazy sections
+        are awaited.  The link targets of a root document structure are
+        written after all of its sections, like ``flush_page`` writes
+        them, rather than at its beginning.
+
+        This requires Python 3.6 or later::
+
+            async for chunk in doc.aflush():
+                await response.write(chunk)
+
+        :param target: The target to flush when the document was written
+            for several targets. Defaults to the document's target.
+        :param normalizer: A ``WhitespaceNormalizer`` to remove redundant
+            whitespace from the flushed document with.
+        """
+        if sys.version_info < (3, 6):
+            raise RuntimeError('aflush requires Python 3.6 or later')
+        from bcdoc.asyncflush import aflush
+        return aflush(self, target, normalizer)
+
+    def _iter_normalized(self, chunks, normalizer):
+        for chunk in chunks:
+            chunk = normalizer.feed(chunk)
+            if chunk:
+                yield chunk
+        chunk = normalizer.close()
+        if chunk:
+            yield chunk
+
+    def flush_targets(self):
+        """Flushes a doc structure once for each of its targets
+
+        :rtype: OrderedDict
+        :returns: The flushed document keyed by target.
+        """
+        if len(self._path_key) == 1:
+            self._parse_all_deferred_doc_strings()
+            self._write_link_targets()
+        flushed = OrderedDict()
+        for target in self.targets or [self.target]:
+            flushed[target] = b''.join(self._iter_flush(target))
+        return flushed
+
+    def _parse_all_deferred_doc_strings(self):
+        self._parse_deferred_doc_strings()
+        for section in self._structure.values():
+            section._parse_all_deferred_doc_strings()
+
+    def flush_sections(self, target=None):
+        """Flushes a doc structure section by section
+
+        :param target: The target to flush when the document was written
+            for several targets. Defaults to the document's target.
+        :returns: An iterator of ``(path, value)`` pairs, one for each
+            section in the order they are flushed, where the path is a
+            tuple and the value holds only the section's own content.
+        """
+        if len(self._path_key) == 1:
+            self._parse_all_deferred_doc_strings()
+            self._write_link_targets()
+        return self._iter_sections(target)
+
+    def validate(self, target=None):
+        """Checks the ReST of each section for structural problems
+
+        This runs the quick checks in ``bcdoc.validator`` over each
+        section without writing the link target definitions.
+
+        :rtype: list
+        :returns: A ``ValidationProblem``, with the path of the section it
+            was found in, for each problem.
+        """
+        from bcdoc.validator import validate_sections
+        self._parse_all_deferred_doc_strings()
+        return validate_sections(self._iter_sections(target),
+                                 link_targets=self.hrefs)
+
+    def _section_path(self):
+        return self._path_key
+
+    def _iter_toc_entries(self):
+        for entry in self._toc_entries:
+            yield entry
+        for section in self._structure.values():
+            for entry in section._iter_toc_entries():
+                yield entry
+
+    def _iter_sections(self, target):
+        for path, section in self._iter_subtree():
+            yield path, b''.join(section._iter_value(target))
+
+    def _iter_value(self, target, at_line_start=True):
+        # at_line_start tells whether the value starts at the beginning
+        # of a line, where the first line of a cloned section has to be
+        # re-indented along with the others.
+        if self._spilled is not None:
+            chunks = self.spill_file.read(
+                *self._spilled[target or self.target])
+            if self._spilled_reindent:
+                chunks = [self.style.reindent(
+                    b''.join(chunks).decode('utf-8'),
+                    self._spilled_reindent, at_line_start).encode('utf-8')]
+            for chunk in chunks:
+                if chunk:
+                    at_line_start = chunk.endswith(b'\n')
+                yield chunk
+        self._parse_deferred_doc_strings()
+        if self._reindent or not any(
+                isinstance(write, LiteralReference) for write in self._writes):
+            yield self._getvalue(target, at_line_start)
+            return
+        # Literal blocks written by reference are streamed as they are
+        # read rather than joined with the rest of the value.
+        target = target or self.target
+        writes = []
+        for write in self._writes:
+            if isinstance(write, _TargetFork):
+                write = write.values[target]
+            if not isinstance(write, LiteralReference):
+                writes.append(write)
+                continue
+            yield self.style.join_writes(writes).encode('utf-8')
+            writes = []
+            for text in write.iter_text():
+                yield text.encode('utf-8')
+        yield self.style.join_writes(writes).encode('utf-8')
+
+    def _iter_flush(self, target, at_line_start=True):
+        for chunk in self._iter_value(target, at_line_start):
+            if chunk:
+                at_line_start = chunk.endswith(b'\n')
+            yield chunk
         for name, section in self._structure.items():
-            value += section.flush_structure()
+            for chunk in section._iter_flush(target, at_line_start):
+                if chunk:
+                    at_line_start = chunk.endswith(b'\n')
+                yield chunk
+
+    def flush_pages(self, depth=1):
+        """Flushes a doc structure into one string per page
+
+        Each section ``depth`` levels below this document structure is
+        flushed, along with all of its subsections, as a page of its
+        own.  Everything above that depth is flushed into the page of
+        this document structure.
+
+        :param depth: How many levels below this document structure
+            the sections that become pages are.
+        :rtype: OrderedDict
+        :returns: The flushed pages keyed by the path of the section
+            as a tuple, in the order they appear in the document.
+        """
+        self._parse_all_deferred_doc_strings()
+        pages = OrderedDict()
+        self._flush_page(depth, pages)
+        return pages
+
+    def flush_page(self, depth=1):
+        """Flushes the page of a doc structure without the pages below it
+
+        The page is flushed like ``flush_pages`` flushes the page of this
+        document structure, but the sections that are pages of their own
+        are left out without being flushed, so lazy sections on them are
+        not written.  Its link target definitions are those of the
+        sections written so far.
+
+        :param depth: How many levels below this document structure
+            the sections that become pages are, or 0 to flush every
+            section below it into the page.
+        """
+        return (self._flush_page_contents(depth, None) +
+                self._link_targets_value())
+
+    def _flush_page(self, depth, pages):
+        path = self._path_key
+        # Reserve the slot so the page comes before its subpages.
+        pages[path] = None
+        value = self._flush_page_contents(depth, pages)
+        pages[path] = value + self._link_targets_value()
+
+    def _flush_page_contents(self, depth, pages, at_line_start=True):
+        value = b''.join(self._iter_value(None, at_line_start))
+        for name, section in self._structure.items():
+            if depth == 1:
+                if pages is not None:
+                    section._flush_page(0, pages)
+            else:
+                value += section._flush_page_contents(
+                    max(depth - 1, 0), pages,
+                    value.endswith(b'\n') if value else at_line_start)
+        return value
+
+    def _link_targets_value(self):
+        # Each page needs its own link target definitions but writing
+        # them should not change the document itself.
+        if not self.hrefs:
+            return b''
+        return self._capture_value(self._write_link_targets)
+
+    def _capture_value(self, write_func):
+        # Returns the value written by write_func without keeping it in
+        # the document.
+        self._track_checkpoints()
+        writes = self._writes
+        checkpoints = self._checkpoints
+        # Styles keep state between calls, such as an open toctree in
+        # HTMLStyle, that must not outlive the captured value either.
+        style_state = dict(self.style.__dict__)
+        self._writes = WriteBuffer()
+        self._checkpoints = []
+        try:
+            write_func()
+            return self.getvalue()
+        finally:
+            self._writes = writes
+            self._checkpoints = checkpoints
+            self.style.__dict__.clear()
+            self.style.__dict__.update(style_state)
+
+    def write_pages(self, output_dir, depth=1, extension='.rst',
+                    num_workers=4):
+        """Writes a doc structure to one file per page
+
+        The doc structure is split into pages like ``flush_pages`` does.
+        This document structure's page is written to
+        ``<output_dir>/<name><extension>`` and ends with a toctree of the
+        other pages, which are written to ``<output_dir>/<path>``.
+        Files whose content on disk is already identical are left
+        untouched so their modification times do not change.
+
+        :param output_dir: The directory to write the pages under.
+        :param depth: How many levels below this document structure
+            the sections that become pages are.
+        :param extension: The extension of the page files.
+        :param num_workers: How many pages to write in parallel.
+        :rtype: OrderedDict
+        :returns: Whether each page was written, keyed by its file name.
+        """
+        pages = self.flush_pages(depth)
+        base_path = self._path_key[:-1]
+        filenames = []
+        entries = []
+        for path in pages:
+            relative_path = path[len(base_path):]
+            filenames.append(
+                os.path.join(output_dir, *relative_path) + extension)
+            if path != self._path_key:
+                entries.append((path[-1], '/'.join(relative_path)))
+        values = list(pages.values())
+        if entries:
+            values[0] += self._capture_value(
+                lambda: self._write_toctree(entries))
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(num_workers)
+        try:
+            written = pool.map(_write_if_changed, zip(filenames, values))
+        finally:
+            pool.close()
+            pool.join()
+        return OrderedDict(zip(filenames, written))
+
+    def _write_toctree(self, entries):
+        self.style.new_paragraph()
+        self.style.toctree()
+        for item, file_name in entries:
+            self.style.tocitem(item, file_name=file_name)
+
+    def getvalue(self, target=None, normalizer=None):
+        value = self._getvalue(target, at_line_start=True)
+        if normalizer is not None:
+            value = normalizer.normalize(value)
         return value
 
+    def _getvalue(self, target, at_line_start):
+        self._parse_deferred_doc_strings()
+        value = self.style.join_writes(self._resolve_writes(target))
+        if self._reindent:
+            value = self.style.reindent(value, self._reindent, at_line_start)
+        return value.encode('utf-8')
+
+
+def _index_key(path):
+    # The key of a path in the index of a tree's sections: the key of
+    # the parent's path paired with the name, so that a section's key
+    # shares its parent's rather than copying the whole path.
+    key = None
+    for name in path:
+        key = (key, name)
+    return key
+
+
+def _move_span(span, expanded):
+    # Returns where a span of writes ends up once deferred doc strings
+    # before it were parsed, or where its own doc string was parsed to.
+    start, end = span
+    for position, parsed_start, parsed_end in expanded:
+        if (start, end) == (position, position + 1):
+            return parsed_start, parsed_end
+    moved = []
+    for offset in (start, end):
+        for position, parsed_start, parsed_end in expanded:
+            if position < offset:
+                offset += parsed_end - parsed_start - 1
+        moved.append(offset)
+    return tuple(moved)
+
+
+def _log_parse_error(doc_string):
+    LOG.debug('Error parsing doc string', exc_info=True)
+    LOG.debug(doc_string)
+
+
+class LinkTargetRegistry(object):
+    """Collects link target definitions shared by many documents
+
+    Documents that have the registry as their ``link_registry`` add their
+    link targets to it when they are flushed and include the file the
+    registry is written to instead of defining the targets themselves.
+    A document using a target whose name is already registered with a
+    different link defines all of its targets itself instead, since
+    including the file would define that name twice.
+
+    :param include_path: The path the documents include the definitions
+        from.  A path starting with ``/`` is relative to the Sphinx
+        source directory, so it works from pages at any depth.
+    """
+
+    def __init__(self, include_path):
+        self.include_path = include_path
+        self._links = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, refname, link):
+        """Adds a link target to the registry
+
+        :returns: Whether the target is defined by the registry.
+        """
+        # Link target names are not case or whitespace sensitive.
+        key = ' '.join(refname.split()).lower()
+        with self._lock:
+            registered = self._links.setdefault(key, (refname, link))
+        return registered[1] == link
+
+    def __len__(self):
+        return len(self._links)
+
+    def items(self):
+        """Returns the ``(refname, link)`` pairs that were registered."""
+        return list(self._links.values())
+
     def getvalue(self):
-        return ''.join(self._writes).encode('utf-8')
+        """Returns the content of the include file as bytes."""
+        doc = ReSTDocument()
+        for refname, link in self.items():
+            doc.style.link_target_definition(refname, link)
+        return doc.getvalue()
+
+    def write(self, filename):
+        """Writes the include file unless it is already up to date
+
+        :returns: Whether the file was written.
+        """
+        return _write_if_changed((filename, self.getvalue()))
+
+
+def _write_if_changed(filename_and_value):
+    filename, value = filename_and_value
+    if os.path.isfile(filename) and os.path.getsize(filename) == len(value):
+        with open(filename, 'rb') as f:
+            if f.read() == value:
+                return False
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Another page in the same directory may have created it.
+            if not os.path.isdir(directory):
+                raise
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        f.write(value)
+    replace_file(temp_filename, filename)
+    return True
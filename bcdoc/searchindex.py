@@ -0,0 +1,205 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import json
+import re
+import zlib
+
+import six
+
+from bcdoc.compat import replace_file
+
+FORMAT_VERSION = 1
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchIndexError(Exception):
+    pass
+
+
+def tokenize(text):
+    """Splits text into lower case search terms."""
+    if isinstance(text, six.binary_type):
+        text = text.decode('utf-8')
+    return [token.lower() for token in _TOKEN_RE.findall(text)]
+
+
+class SearchIndex(object):
+    """An inverted index of the words written to document sections.
+
+    Set a search index as the ``search_index`` of a document structure
+    root to have the text of its doc strings and its headings added to
+    the index as they are written.  For each term the index keeps the
+    sections it appears in and the positions of the term within each
+    section's text, so phrases can be searched for as well.
+
+    Text removed from a document after it was written, for example by
+    ``remove_last_doc_string``, stays in the index.
+    """
+
+    def __init__(self):
+        self._paths = []
+        self._path_ids = {}
+        # The number of terms indexed for each section, which is also
+        # the position of the next term written to it.
+        self._lengths = []
+        # term -> {path id -> [position, ...]}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._postings)
+
+    @property
+    def paths(self):
+        """The paths of the indexed sections in the order they were added."""
+        return list(self._paths)
+
+    def _get_path_id(self, path):
+        path = tuple(path)
+        path_id = self._path_ids.get(path)
+        if path_id is None:
+            path_id = len(self._paths)
+            self._path_ids[path] = path_id
+            self._paths.append(path)
+            self._lengths.append(0)
+        return path_id
+
+    def add_text(self, path, text):
+        """Indexes text written to the section at path."""
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        path_id = self._get_path_id(path)
+        position = self._lengths[path_id]
+        for token in tokens:
+            self._postings.setdefault(token, {}).setdefault(
+                path_id, []).append(position)
+            position += 1
+        self._lengths[path_id] = position
+
+    def merge(self, other):
+        """Adds everything indexed by another search index to this one.
+
+        Sections indexed by both have the other index's terms placed
+        after the ones already in this index.
+        """
+        path_ids = []
+        offsets = []
+        for path, length in zip(other._paths, other._lengths):
+            path_id = self._get_path_id(path)
+            path_ids.append(path_id)
+            offsets.append(self._lengths[path_id])
+            self._lengths[path_id] += length
+        for term, postings in other._postings.items():
+            term_postings = self._postings.setdefault(term, {})
+            for other_id, positions in postings.items():
+                offset = offsets[other_id]
+                term_postings.setdefault(path_ids[other_id], []).extend(
+                    position + offset for position in positions)
+
+    def search(self, query, phrase=False, limit=None):
+        """Finds the sections containing every term of a query.
+
+        :param query: The text to search for.
+        :param phrase: Whether the terms have to appear next to each
+            other in the order of the query.
+        :param limit: The most results to return.
+        :rtype: list
+        :returns: The paths of the matching sections, the ones with the
+            most occurrences of the terms first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        postings = [self._postings.get(term, {}) for term in terms]
+        path_ids = set(postings[0])
+        for term_postings in postings[1:]:
+            path_ids.intersection_update(term_postings)
+        scores = []
+        for path_id in path_ids:
+            if phrase:
+                score = self._count_phrases(path_id, postings)
+            else:
+                score = sum(len(p[path_id]) for p in postings)
+            if score:
+                scores.append((-score, path_id))
+        scores.sort()
+        return [self._paths[path_id] for score, path_id in scores[:limit]]
+
+    def _count_phrases(self, path_id, postings):
+        starts = set(postings[0][path_id])
+        for offset, term_postings in enumerate(postings[1:], 1):
+            starts.intersection_update(
+                position - offset for position in term_postings[path_id])
+        return len(starts)
+
+    def save(self, filename):
+        """Writes the index to a compressed file.
+
+        Positions are stored as the differences between consecutive
+        positions, which keeps the numbers in the file small.
+        """
+        postings = {}
+        for term, term_postings in self._postings.items():
+            encoded = []
+            for path_id in sorted(term_postings):
+                positions = term_postings[path_id]
+                encoded.append(path_id)
+                encoded.append(len(positions))
+                previous = 0
+                for position in positions:
+                    encoded.append(position - previous)
+                    previous = position
+            postings[term] = encoded
+        data = {
+            'version': FORMAT_VERSION,
+            'paths': [list(path) for path in self._paths],
+            'lengths': self._lengths,
+            'postings': postings,
+        }
+        value = json.dumps(data, separators=(',', ':'), sort_keys=True)
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            f.write(zlib.compress(value.encode('utf-8'), 9))
+        replace_file(temp_filename, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """Reads an index written by ``save``.
+
+        :raises SearchIndexError: If the file is not a search index.
+        """
+        with open(filename, 'rb') as f:
+            try:
+                data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            except (zlib.error, ValueError):
+                raise SearchIndexError('Not a search index: %s' % filename)
+        if data.get('version') != FORMAT_VERSION:
+            raise SearchIndexError(
+                'Unsupported search index version: %r' % data.get('version'))
+        index = cls()
+        for path in data['paths']:
+            index._get_path_id(path)
+        index._lengths = data['lengths']
+        for term, encoded in data['postings'].items():
+            term_postings = index._postings[term] = {}
+            i = 0
+            while i < len(encoded):
+                path_id, count = encoded[i], encoded[i + 1]
+                positions = []
+                position = 0
+                for delta in encoded[i + 2:i + 2 + count]:
+                    position += delta
+                    positions.append(position)
+                term_postings[path_id] = positions
+                i += 2 + count
+        return index
@@ -0,0 +1,107 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import hashlib
+import json
+import os
+import zlib
+
+from bcdoc.compat import replace_file
+
+
+class SectionStore(object):
+    """Stores flushed document sections once per unique content.
+
+    Each section is compressed on its own and appended to a pack file
+    so any section can be read back without decompressing the others.
+    Sections are keyed by the sha256 digest of their content and a
+    document is stored as a manifest, the list of digests of its
+    sections in flush order.
+
+    :param directory: The directory holding the pack and index files.
+        It is created if it does not exist.
+    """
+
+    PACK_FILENAME = 'sections.pack'
+    INDEX_FILENAME = 'sections.idx'
+
+    def __init__(self, directory, compression_level=9):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._pack_filename = os.path.join(directory, self.PACK_FILENAME)
+        self._index_filename = os.path.join(directory, self.INDEX_FILENAME)
+        self._compression_level = compression_level
+        self._index = {}
+        if os.path.exists(self._index_filename):
+            with open(self._index_filename, 'r') as f:
+                self._index = json.load(f)
+        self._pack = open(self._pack_filename, 'a+b')
+
+    def __contains__(self, digest):
+        return digest in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def put(self, value):
+        """Stores a section's bytes and returns their digest."""
+        digest = hashlib.sha256(value).hexdigest()
+        if digest not in self._index:
+            compressed = zlib.compress(value, self._compression_level)
+            self._pack.seek(0, os.SEEK_END)
+            self._index[digest] = [self._pack.tell(), len(compressed)]
+            self._pack.write(compressed)
+        return digest
+
+    def get(self, digest):
+        """Returns the bytes of a single section.
+
+        :raises KeyError: If no section with the digest is stored.
+        """
+        offset, length = self._index[digest]
+        self._pack.seek(offset)
+        return zlib.decompress(self._pack.read(length))
+
+    def add_document(self, doc, target=None):
+        """Stores every section of a flushed document structure.
+
+        :rtype: list
+        :returns: The manifest of the document.
+        """
+        return [self.put(value) for path, value in doc.flush_sections(target)]
+
+    def iter_document(self, manifest):
+        """Yields the sections of a stored document in order."""
+        for digest in manifest:
+            yield self.get(digest)
+
+    def get_document(self, manifest):
+        """Rebuilds the flushed bytes of a stored document."""
+        return b''.join(self.iter_document(manifest))
+
+    def save(self):
+        """Writes the index so the stored sections can be found again."""
+        self._pack.flush()
+        temp_filename = self._index_filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump(self._index, f)
+        replace_file(temp_filename, self._index_filename)
+
+    def close(self):
+        self.save()
+        self._pack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
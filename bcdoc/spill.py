@@ -0,0 +1,61 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import os
+import tempfile
+
+from bcdoc.fileutils import READ_SIZE
+
+DEFAULT_MEMORY_LIMIT = 8 * 1024 * 1024
+
+
+class SpillFile(object):
+    """Stores segments of encoded document content outside of the document.
+
+    Segments are kept in memory until their total size goes over
+    ``memory_limit`` after which they are all moved to a temporary file
+    on disk.
+    """
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self._file = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+
+    @property
+    def on_disk(self):
+        """Whether the segments have been moved to disk."""
+        return self._file._rolled
+
+    def write(self, data):
+        """Stores a segment.
+
+        :rtype: tuple
+        :returns: The offset and length of the segment.
+        """
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset, len(data)
+
+    def read(self, offset, length, read_size=READ_SIZE):
+        """Yields the content of a segment in chunks of at most read_size."""
+        while length > 0:
+            self._file.seek(offset)
+            chunk = self._file.read(min(length, read_size))
+            if not chunk:
+                break
+            offset += len(chunk)
+            length -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self._file.close()
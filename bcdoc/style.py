@@ -11,11 +11,29 @@
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
 
+import functools
 import logging
+import textwrap
+
+import six
+
+from bcdoc.literalref import LiteralReference
+
 
 logger = logging.getLogger('bcdocs')
 
 
+def _target_dependent(method):
+    # Style methods whose output depends on the document's target are
+    # written once per target when the document has several targets.
+    @functools.wraps(method)
+    def _write(self, *args, **kwargs):
+        if not getattr(self.doc, 'targets', None):
+            return method(self, *args, **kwargs)
+        self.doc.write_for_targets(lambda: method(self, *args, **kwargs))
+    return _write
+
+
 class BaseStyle(object):
 
     def __init__(self, doc, indent_width=2):
@@ -24,26 +42,86 @@ class BaseStyle(object):
         self._indent = 0
         self.keep_data = True
 
+    @property
+    def indent_width(self):
+        return self._indent_width
+
+    @indent_width.setter
+    def indent_width(self, value):
+        self._indent_width = value
+        # The indentation of every line written is looked up here so
+        # the prefix for each level is only built once.
+        self._prefixes = ['']
+
     @property
     def indentation(self):
         return self._indent
 
     @indentation.setter
     def indentation(self, value):
+        self._track_checkpoints()
         self._indent = value
 
     def new_paragraph(self):
-        return '\n%s' % self.spaces()
+        return '\n' + self.spaces()
 
     def indent(self):
+        self._track_checkpoints()
         self._indent += 1
 
     def dedent(self):
         if self._indent > 0:
+            self._track_checkpoints()
             self._indent -= 1
 
+    def _track_checkpoints(self):
+        # The indentation is rolled back with the document, which has to
+        # checkpoint it before it changes.
+        if self.doc is not None:
+            self.doc._track_checkpoints()
+
     def spaces(self):
-        return ' ' * (self._indent * self.indent_width)
+        indent = self._indent
+        prefixes = self._prefixes
+        if indent < len(prefixes):
+            return prefixes[max(indent, 0)]
+        while len(prefixes) <= indent:
+            prefixes.append(' ' * (len(prefixes) * self._indent_width))
+        return prefixes[indent]
+
+    def escape(self, s):
+        """Escapes text taken from a doc string for the output format."""
+        return s
+
+    def join_writes(self, writes):
+        """Joins the writes recorded by a document into its final text."""
+        return ''.join(writes)
+
+    def reindent(self, s, levels, at_line_start=False):
+        """Shifts text written at one indentation by a number of levels.
+
+        The first line is only shifted when the text starts at the
+        beginning of a line, since otherwise it continues whatever was
+        written before the text.
+        """
+        if not levels:
+            return s
+        width = abs(levels) * self.indent_width
+        lines = s.split('\n')
+        for i in range(0 if at_line_start else 1, len(lines)):
+            line = lines[i]
+            if levels > 0:
+                if line:
+                    lines[i] = ' ' * width + line
+            else:
+                lines[i] = line[min(width, len(line) - len(line.lstrip(' '))):]
+        return '\n'.join(lines)
+
+    def include(self, filename):
+        """Includes the contents of a file where the document is read."""
+        raise ValueError(
+            '%s cannot include files, so its documents cannot share link '
+            'targets through a link registry' % self.__class__.__name__)
 
     def bold(self, s):
         return s
@@ -73,11 +151,11 @@ class ReSTStyle(BaseStyle):
 
     def new_paragraph(self):
         if self.do_p:
-            self.doc.write('\n\n%s' % self.spaces())
+            self.doc.write('\n\n' + self.spaces())
 
     def new_line(self):
         if self.do_p:
-            self.doc.write('\n%s' % self.spaces())
+            self.doc.write('\n' + self.spaces())
 
     def _start_inline(self, markup):
         self.doc.write(markup)
@@ -125,12 +203,15 @@ class ReSTStyle(BaseStyle):
         self.new_paragraph()
 
     def h1(self, s):
+        self.doc.add_toc_entry(s, 1)
         self._heading(s, '*')
 
     def h2(self, s):
+        self.doc.add_toc_entry(s, 2)
         self._heading(s, '=')
 
     def h3(self, s):
+        self.doc.add_toc_entry(s, 3)
         self._heading(s, '-')
 
     def start_italics(self, attrs=None):
@@ -147,7 +228,7 @@ class ReSTStyle(BaseStyle):
 
     def start_p(self, attrs=None):
         if self.do_p:
-            self.doc.write('\n\n%s' % self.spaces())
+            self.doc.write('\n\n' + self.spaces())
 
     def end_p(self):
         if self.do_p:
@@ -204,6 +285,10 @@ class ReSTStyle(BaseStyle):
     def link_target_definition(self, refname, link):
         self.doc.writeln('.. _%s: %s' % (refname, link))
 
+    def include(self, filename):
+        self.doc.writeln('.. include:: %s' % filename)
+
+    @_target_dependent
     def sphinx_reference_label(self, label, text=None):
         if text is None:
             text = label
@@ -216,27 +301,48 @@ class ReSTStyle(BaseStyle):
         self.doc.do_translation = False
         if self.a_href:
             last_write = self.doc.pop_write()
-            last_write = last_write.rstrip(' ')
-            if last_write and last_write != '`':
-                if ':' in last_write:
-                    last_write = last_write.replace(':', r'\:')
-                self.doc.push_write(last_write)
-                self.doc.hrefs[last_write] = self.a_href
-                self.doc.write('`_')
-            elif last_write == '`':
-                # Look at start_a().  It will do a self.doc.write('`')
-                # which is the start of the link title.  If that is the
-                # case then there was no link text.  We should just
-                # use an inline link.  The syntax of this is
-                # `<http://url>`_
-                self.doc.push_write('`<%s>`_' % self.a_href)
+            if isinstance(last_write, six.string_types):
+                last_write = last_write.rstrip(' ')
+                if last_write == '`':
+                    # Look at start_a().  It will do a self.doc.write('`')
+                    # which is the start of the link title.  If that is
+                    # the case then there was no link text.  We should
+                    # just use an inline link.  The syntax of this is
+                    # `<http://url>`_
+                    self.doc.push_write('`<%s>`_' % self.a_href)
+                else:
+                    self.doc.push_write(self._link_reference(last_write))
             else:
-                self.doc.push_write(self.a_href)
-                self.doc.hrefs[self.a_href] = self.a_href
-                self.doc.write('`_')
+                # The link text was written differently for each target
+                # of the document.  Only the text of the document's own
+                # target is defined as a link target, since they all
+                # share the link targets.  The other targets embed the
+                # link in an anonymous reference instead.
+                text = last_write.values[self.doc.target].rstrip(' ')
+                values = {}
+                for target, value in last_write.values.items():
+                    value = value.rstrip(' ')
+                    if value == text:
+                        values[target] = self._link_reference(value)
+                    elif value:
+                        values[target] = '%s <%s>`__' % (
+                            value.replace(':', r'\:'), self.a_href)
+                    else:
+                        values[target] = '<%s>`_' % self.a_href
+                self.doc.push_write(last_write.__class__(values))
             self.a_href = None
         self.doc.write(' ')
 
+    def _link_reference(self, text):
+        # Defines a link target for the link text and returns the end
+        # of the reference to it.
+        if not text:
+            text = self.a_href
+        elif ':' in text:
+            text = text.replace(':', r'\:')
+        self.doc.hrefs[text] = self.a_href
+        return text + '`_'
+
     def start_i(self, attrs=None):
         self.doc.do_translation = True
         self.start_italics()
@@ -305,6 +411,20 @@ class ReSTStyle(BaseStyle):
         self.doc.writeln(code)
         self.end_codeblock()
 
+    def codeblock_reference(self, source):
+        """
+        Writes a literal code block whose text is read from source only
+        when the document is flushed.  Every line is indented, so the
+        text never has to be held in the document.
+
+        :param source: A file path, a buffer such as an mmap, a file-like
+            object or a callable, as taken by ``LiteralReference``.
+        """
+        self.start_codeblock()
+        self.doc.write(LiteralReference(source, self.spaces()))
+        self.end_codeblock()
+
+    @_target_dependent
     def toctree(self):
         if self.doc.target == 'html':
             self.doc.write('\n.. toctree::\n')
@@ -313,6 +433,7 @@ class ReSTStyle(BaseStyle):
         else:
             self.start_ul()
 
+    @_target_dependent
     def tocitem(self, item, file_name=None):
         if self.doc.target == 'man':
             self.li(item)
@@ -322,12 +443,14 @@ class ReSTStyle(BaseStyle):
             else:
                 self.doc.writeln('  %s' % item)
 
+    @_target_dependent
     def hidden_toctree(self):
         if self.doc.target == 'html':
             self.doc.write('\n.. toctree::\n')
             self.doc.write('  :maxdepth: 1\n')
             self.doc.write('  :hidden:\n\n')
 
+    @_target_dependent
     def hidden_tocitem(self, item):
         if self.doc.target == 'html':
             self.tocitem(item)
@@ -340,6 +463,7 @@ class ReSTStyle(BaseStyle):
             self.doc.writeln('   :depth: %s' % depth)
 
     def start_sphinx_py_class(self, class_name):
+        self.doc.add_toc_entry(class_name, 4, 'class')
         self.new_paragraph()
         self.doc.write('.. py:class:: %s' % class_name)
         self.indent()
@@ -350,6 +474,7 @@ class ReSTStyle(BaseStyle):
         self.new_paragraph()
 
     def start_sphinx_py_method(self, method_name, parameters=None):
+        self.doc.add_toc_entry(method_name, 5, 'method')
         self.new_paragraph()
         content = '.. py:method:: %s' % method_name
         if parameters is not None:
@@ -363,6 +488,634 @@ class ReSTStyle(BaseStyle):
         self.new_paragraph()
 
     def write_py_doc_string(self, docstring):
-        docstring_lines = docstring.splitlines()
-        for docstring_line in docstring_lines:
-            self.doc.writeln(docstring_line)
+        self.doc.writelines(docstring.splitlines())
+
+
+class _TextBlock(object):
+    """Marks the start of a block of text in a document using TextStyle.
+
+    The text written after the marker, up to the next marker, is
+    rendered as one block when the document's value is requested.
+    """
+
+    def __init__(self, indent, prefix='', blank_line=True, wrap=True):
+        self.indent = indent
+        self.prefix = prefix
+        self.blank_line = blank_line
+        self.wrap = wrap
+
+
+class TextStyle(BaseStyle):
+    """Writes documents directly as wrapped plain text.
+
+    This supports the same calls as ``ReSTStyle`` but instead of writing
+    ReST that has to be converted to text with docutils, paragraphs are
+    wrapped as the document's value is requested.
+    """
+
+    def __init__(self, doc, indent_width=2, width=70):
+        BaseStyle.__init__(self, doc, indent_width)
+        self.width = width
+        self.do_p = True
+        self.a_href = None
+        self._wrap = True
+
+    def _new_block(self, blank_line, prefix=''):
+        self.doc.write(
+            _TextBlock(self.spaces(), prefix, blank_line, self._wrap))
+
+    def new_paragraph(self):
+        if self.do_p:
+            self._new_block(True)
+
+    def new_line(self):
+        if self.do_p:
+            self._new_block(False)
+
+    def _start_inline(self, markup):
+        self.doc.write(markup)
+
+    def _end_inline(self, markup):
+        # Strip the whitespace between the text and the closing markup
+        # the same way ReSTStyle does.
+        last_write = self.doc.peek_write()
+        if isinstance(last_write, six.string_types):
+            self.doc.push_write(self.doc.pop_write().rstrip(' '))
+        self.doc.write(markup + ' ')
+
+    def start_bold(self, attrs=None):
+        self._start_inline('**')
+
+    def end_bold(self):
+        self._end_inline('**')
+
+    def start_b(self, attrs=None):
+        self.doc.do_translation = True
+        self.start_bold(attrs)
+
+    def end_b(self):
+        self.doc.do_translation = False
+        self.end_bold()
+
+    def bold(self, s):
+        if s:
+            self.start_bold()
+            self.doc.write(s)
+            self.end_bold()
+
+    def ref(self, title, link=None):
+        self.doc.write(title)
+
+    def _heading(self, s, border_char):
+        self._wrap = False
+        self.new_paragraph()
+        self._wrap = True
+        self.doc.write('%s%s\n%s%s' % (self.spaces(), s, self.spaces(),
+                                       border_char * len(s)))
+        self.new_paragraph()
+
+    def h1(self, s):
+        self.doc.add_toc_entry(s, 1)
+        self._heading(s, '*')
+
+    def h2(self, s):
+        self.doc.add_toc_entry(s, 2)
+        self._heading(s, '=')
+
+    def h3(self, s):
+        self.doc.add_toc_entry(s, 3)
+        self._heading(s, '-')
+
+    def start_italics(self, attrs=None):
+        self._start_inline('*')
+
+    def end_italics(self):
+        self._end_inline('*')
+
+    def italics(self, s):
+        if s:
+            self.start_italics()
+            self.doc.write(s)
+            self.end_italics()
+
+    def start_p(self, attrs=None):
+        self.new_paragraph()
+
+    def end_p(self):
+        self.new_paragraph()
+
+    def start_code(self, attrs=None):
+        self.doc.do_translation = True
+        self._start_inline('"')
+
+    def end_code(self):
+        self.doc.do_translation = False
+        self._end_inline('"')
+
+    def code(self, s):
+        if s:
+            self.start_code()
+            self.doc.write(s)
+            self.end_code()
+
+    def _start_admonition(self, title):
+        self.new_paragraph()
+        self.doc.write(title)
+        self.indent()
+        self.new_paragraph()
+
+    def _end_admonition(self):
+        self.dedent()
+        self.new_paragraph()
+
+    def start_note(self, attrs=None):
+        self._start_admonition('Note:')
+
+    def end_note(self):
+        self._end_admonition()
+
+    def start_important(self, attrs=None):
+        self._start_admonition('Warning:')
+
+    def end_important(self):
+        self._end_admonition()
+
+    def start_a(self, attrs=None):
+        if attrs:
+            for attr_key, attr_value in attrs:
+                if attr_key == 'href':
+                    self.a_href = attr_value
+        self.doc.do_translation = True
+
+    def end_a(self):
+        self.doc.do_translation = False
+        if self.a_href:
+            try:
+                last_write = self.doc.peek_write()
+            except IndexError:
+                last_write = None
+            if (isinstance(last_write, six.string_types) and
+                    last_write.strip()):
+                self.doc.hrefs[last_write.strip()] = self.a_href
+            else:
+                self.doc.write(self.a_href)
+            self.a_href = None
+
+    def link_target_definition(self, refname, link):
+        self._wrap = False
+        self._new_block(False)
+        self._wrap = True
+        self.doc.write('%s%s: %s' % (self.spaces(), refname, link))
+
+    def sphinx_reference_label(self, label, text=None):
+        if text is None:
+            text = label
+        self.doc.write(text)
+
+    def start_i(self, attrs=None):
+        self.doc.do_translation = True
+        self.start_italics()
+
+    def end_i(self):
+        self.doc.do_translation = False
+        self.end_italics()
+
+    def start_li(self, attrs=None):
+        self._new_block(False, '* ')
+        self.do_p = False
+
+    def end_li(self):
+        self.do_p = True
+        self.new_line()
+
+    def li(self, s):
+        if s:
+            self.start_li()
+            self.doc.write(s)
+            self.end_li()
+
+    def start_ul(self, attrs=None):
+        self.new_paragraph()
+
+    def end_ul(self):
+        self.new_paragraph()
+
+    def start_ol(self, attrs=None):
+        self.new_paragraph()
+
+    def end_ol(self):
+        self.new_paragraph()
+
+    def start_examples(self, attrs=None):
+        self.doc.keep_data = False
+
+    def end_examples(self):
+        self.doc.keep_data = True
+
+    def start_fullname(self, attrs=None):
+        self.doc.keep_data = False
+
+    def end_fullname(self):
+        self.doc.keep_data = True
+
+    def start_codeblock(self, attrs=None):
+        self.indent()
+        self._wrap = False
+        self.new_paragraph()
+
+    def end_codeblock(self):
+        self.dedent()
+        self._wrap = True
+        self.new_paragraph()
+
+    def codeblock(self, code):
+        self.start_codeblock()
+        self.doc.writelines(code.splitlines())
+        self.end_codeblock()
+
+    def codeblock_reference(self, source):
+        # Text blocks are wrapped as a whole so the text is read now.
+        self.codeblock(LiteralReference(source).getvalue())
+
+    def toctree(self):
+        self.start_ul()
+
+    def tocitem(self, item, file_name=None):
+        self.li(item)
+
+    def hidden_toctree(self):
+        pass
+
+    def hidden_tocitem(self, item):
+        pass
+
+    def table_of_contents(self, title=None, depth=None):
+        pass
+
+    def start_sphinx_py_class(self, class_name):
+        self.doc.add_toc_entry(class_name, 4, 'class')
+        self._start_admonition('class %s' % class_name)
+
+    def end_sphinx_py_class(self):
+        self._end_admonition()
+
+    def start_sphinx_py_method(self, method_name, parameters=None):
+        self.doc.add_toc_entry(method_name, 5, 'method')
+        content = method_name
+        if parameters is not None:
+            content += '(%s)' % parameters
+        self._start_admonition(content)
+
+    def end_sphinx_py_method(self):
+        self._end_admonition()
+
+    def write_py_doc_string(self, docstring):
+        self.doc.writelines(docstring.splitlines())
+
+    def join_writes(self, writes):
+        lines = []
+        block = _TextBlock('', blank_line=False)
+        parts = []
+        blank_line = False
+        for write in writes:
+            if isinstance(write, _TextBlock):
+                blank_line = self._render_block(block, parts, lines,
+                                                blank_line)
+                block = write
+                parts = []
+            else:
+                parts.append(write)
+        if self._render_block(block, parts, lines, blank_line) and lines:
+            lines.append('')
+        if not lines:
+            return ''
+        return '\n'.join(lines) + '\n'
+
+    def _render_block(self, block, parts, lines, blank_line):
+        # Returns whether a blank line is still owed before the next
+        # block because this block turned out to be empty.
+        blank_line = blank_line or block.blank_line
+        text = ''.join(parts)
+        if not text.strip():
+            return blank_line
+        if blank_line and (not lines or lines[-1]):
+            lines.append('')
+        if block.wrap:
+            lines.extend(textwrap.wrap(
+                ' '.join(text.split()), width=self.width,
+                initial_indent=block.indent + block.prefix,
+                subsequent_indent=block.indent + ' ' * len(block.prefix),
+                break_long_words=False, break_on_hyphens=False))
+        else:
+            text = text.strip('\n')
+            lines.extend(line.rstrip() for line in text.split('\n'))
+        return False
+
+
+def _escape_html(s, quote=False):
+    s = s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if quote:
+        s = s.replace('"', '&quot;')
+    return s
+
+
+class HTMLStyle(BaseStyle):
+    """Writes documents directly as HTML fragments.
+
+    This supports the same calls as ``ReSTStyle`` but writes the HTML
+    that Sphinx would produce for them, so the output does not need to
+    be parsed again as ReST.
+    """
+
+    def __init__(self, doc, indent_width=2):
+        BaseStyle.__init__(self, doc, indent_width)
+        self.a_href = None
+        self._toctree_open = False
+
+    def escape(self, s):
+        return _escape_html(s)
+
+    def _close_toctree(self):
+        if self._toctree_open:
+            self._toctree_open = False
+            self.doc.write('</ul>\n</div>\n')
+
+    def new_paragraph(self):
+        self._close_toctree()
+        self.doc.write('\n')
+
+    def new_line(self):
+        self.new_paragraph()
+
+    def _wrap_in(self, tag, s, attrs=''):
+        self.doc.write('<%s%s>%s</%s>' % (tag, attrs, _escape_html(s), tag))
+
+    def start_bold(self, attrs=None):
+        self.doc.write('<strong>')
+
+    # The doc string parser drops the whitespace that follows inline
+    # markup so, like ReSTStyle, the closing tags add it back.
+
+    def end_bold(self):
+        self.doc.write('</strong> ')
+
+    def start_b(self, attrs=None):
+        self.doc.do_translation = True
+        self.start_bold(attrs)
+
+    def end_b(self):
+        self.doc.do_translation = False
+        self.end_bold()
+
+    def bold(self, s):
+        if s:
+            self._wrap_in('strong', s)
+
+    def ref(self, title, link=None):
+        if link is None:
+            link = title
+        self.doc.write('<a class="reference internal" href="%s.html">%s</a>'
+                       % (_escape_html(link, quote=True), _escape_html(title)))
+
+    def _heading(self, s, tag):
+        self.new_paragraph()
+        self._wrap_in(tag, s)
+        self.new_paragraph()
+
+    def h1(self, s):
+        self.doc.add_toc_entry(s, 1)
+        self._heading(s, 'h1')
+
+    def h2(self, s):
+        self.doc.add_toc_entry(s, 2)
+        self._heading(s, 'h2')
+
+    def h3(self, s):
+        self.doc.add_toc_entry(s, 3)
+        self._heading(s, 'h3')
+
+    def start_italics(self, attrs=None):
+        self.doc.write('<em>')
+
+    def end_italics(self):
+        self.doc.write('</em> ')
+
+    def italics(self, s):
+        if s:
+            self._wrap_in('em', s)
+
+    def start_p(self, attrs=None):
+        self.new_paragraph()
+        self.doc.write('<p>')
+
+    def end_p(self):
+        self.doc.write('</p>')
+
+    def start_code(self, attrs=None):
+        self.doc.do_translation = True
+        self.doc.write('<code class="docutils literal">')
+
+    def end_code(self):
+        self.doc.do_translation = False
+        self.doc.write('</code> ')
+
+    def code(self, s):
+        if s:
+            self._wrap_in('code', s, ' class="docutils literal"')
+
+    def _start_admonition(self, kind, title):
+        self.new_paragraph()
+        self.doc.write('<div class="admonition %s">\n'
+                       '<p class="admonition-title">%s</p>' % (kind, title))
+        self.new_paragraph()
+
+    def _end_admonition(self):
+        self.new_paragraph()
+        self.doc.write('</div>')
+        self.new_paragraph()
+
+    def start_note(self, attrs=None):
+        self._start_admonition('note', 'Note')
+
+    def end_note(self):
+        self._end_admonition()
+
+    def start_important(self, attrs=None):
+        self._start_admonition('warning', 'Warning')
+
+    def end_important(self):
+        self._end_admonition()
+
+    def start_a(self, attrs=None):
+        if attrs:
+            for attr_key, attr_value in attrs:
+                if attr_key == 'href':
+                    self.a_href = attr_value
+                    self.doc.write(
+                        '<a class="reference external" href="%s">'
+                        % _escape_html(attr_value, quote=True))
+        self.doc.do_translation = True
+
+    def end_a(self):
+        self.doc.do_translation = False
+        if self.a_href:
+            try:
+                last_write = self.doc.peek_write()
+            except IndexError:
+                # Nothing was written, not even the start of the link,
+                # so there is no link to close.
+                self.a_href = None
+                return
+            if (isinstance(last_write, six.string_types) and
+                    last_write.startswith('<a ')):
+                # There was no link text so use the link itself.
+                self.doc.write(_escape_html(self.a_href))
+            self.doc.write('</a> ')
+            self.a_href = None
+
+    def link_target_definition(self, refname, link):
+        # Links are written inline so there is nothing to define.
+        pass
+
+    def include(self, filename):
+        pass
+
+    def reindent(self, s, levels, at_line_start=False):
+        # Indentation is not significant in HTML and would change the
+        # content of preformatted blocks.
+        return s
+
+    def sphinx_reference_label(self, label, text=None):
+        if text is None:
+            text = label
+        self.doc.write('<a class="reference internal" href="#%s">%s</a>'
+                       % (_escape_html(label, quote=True),
+                          _escape_html(text)))
+
+    def start_i(self, attrs=None):
+        self.doc.do_translation = True
+        self.start_italics()
+
+    def end_i(self):
+        self.doc.do_translation = False
+        self.end_italics()
+
+    def start_li(self, attrs=None):
+        self.new_line()
+        self.doc.write('<li>')
+
+    def end_li(self):
+        self.doc.write('</li>')
+
+    def li(self, s):
+        if s:
+            self.start_li()
+            self.doc.write(_escape_html(s))
+            self.end_li()
+
+    def start_ul(self, attrs=None):
+        self.new_paragraph()
+        self.doc.write('<ul>')
+
+    def end_ul(self):
+        self.new_paragraph()
+        self.doc.write('</ul>')
+
+    def start_ol(self, attrs=None):
+        self.new_paragraph()
+        self.doc.write('<ol>')
+
+    def end_ol(self):
+        self.new_paragraph()
+        self.doc.write('</ol>')
+
+    def start_examples(self, attrs=None):
+        self.doc.keep_data = False
+
+    def end_examples(self):
+        self.doc.keep_data = True
+
+    def start_fullname(self, attrs=None):
+        self.doc.keep_data = False
+
+    def end_fullname(self):
+        self.doc.keep_data = True
+
+    def start_codeblock(self, attrs=None):
+        self.new_paragraph()
+        self.doc.write('<pre class="literal-block">')
+
+    def end_codeblock(self):
+        self.doc.write('</pre>')
+        self.new_paragraph()
+
+    def codeblock(self, code):
+        self.start_codeblock()
+        self.doc.write(_escape_html(code))
+        self.end_codeblock()
+
+    def codeblock_reference(self, source):
+        self.codeblock(LiteralReference(source).getvalue())
+
+    def toctree(self):
+        self.new_paragraph()
+        self.doc.write('<div class="toctree-wrapper">\n<ul>\n')
+        self._toctree_open = True
+
+    def tocitem(self, item, file_name=None):
+        if not file_name:
+            file_name = item
+        self.doc.write(
+            '<li class="toctree-l1"><a class="reference internal" '
+            'href="%s.html">%s</a></li>\n'
+            % (_escape_html(file_name, quote=True), _escape_html(item)))
+
+    def hidden_toctree(self):
+        # Hidden toctrees only affect Sphinx's navigation.
+        pass
+
+    def hidden_tocitem(self, item):
+        pass
+
+    def table_of_contents(self, title=None, depth=None):
+        pass
+
+    def _start_definition(self, kind, signature, name):
+        self.new_paragraph()
+        self.doc.write('<dl class="py %s">\n<dt id="%s">%s</dt>\n<dd>'
+                       % (kind, _escape_html(name, quote=True),
+                          _escape_html(signature)))
+        self.new_paragraph()
+
+    def _end_definition(self):
+        self.new_paragraph()
+        self.doc.write('</dd>\n</dl>')
+        self.new_paragraph()
+
+    def start_sphinx_py_class(self, class_name):
+        self.doc.add_toc_entry(class_name, 4, 'class')
+        self._start_definition('class', 'class %s' % class_name, class_name)
+
+    def end_sphinx_py_class(self):
+        self._end_definition()
+
+    def start_sphinx_py_method(self, method_name, parameters=None):
+        self.doc.add_toc_entry(method_name, 5, 'method')
+        signature = method_name
+        if parameters is not None:
+            signature += '(%s)' % parameters
+        self._start_definition('method', signature, method_name)
+
+    def end_sphinx_py_method(self):
+        self._end_definition()
+
+    def write_py_doc_string(self, docstring):
+        self.doc.write('<p>')
+        self.doc.write(_escape_html(docstring))
+        self.doc.write('</p>')
+
+    def join_writes(self, writes):
+        value = ''.join(writes)
+        if self._toctree_open:
+            value += '</ul>\n</div>\n'
+        return value
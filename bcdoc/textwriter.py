@@ -11,19 +11,29 @@
 import os
 import re
 import textwrap
+import threading
 
-from docutils import nodes, writers
+from docutils import frontend, nodes, utils, writers
+from docutils.parsers.rst import Parser
+from docutils.readers.standalone import Reader
 
 
 class TextWrapper(textwrap.TextWrapper):
     """Custom subclass that uses a different word separator regex."""
 
-    wordsep_re = re.compile(
+    # Compiled by the first wrapper created rather than when importing.
+    wordsep_re = None
+    wordsep_pattern = (
         r'(\s+|'                                  # any whitespace
         r'(?<=\s)(?::[a-z-]+:)?`\S+|'             # interpreted text start
         r'[^\s\w]*\w+[a-zA-Z]-(?=\w+[a-zA-Z])|'   # hyphenated words
         r'(?<=[\w\!\"\'\&\.\,\?])-{2,}(?=\w))')   # em-dash
 
+    def __init__(self, *args, **kwargs):
+        if TextWrapper.wordsep_re is None:
+            TextWrapper.wordsep_re = re.compile(self.wordsep_pattern)
+        textwrap.TextWrapper.__init__(self, *args, **kwargs)
+
 
 MAXWIDTH = 70
 STDINDENT = 3
@@ -50,6 +60,56 @@ class TextWriter(writers.Writer):
         self.output = visitor.body
 
 
+class TextRenderer(object):
+    """Converts ReST strings to plain text with a reusable docutils setup.
+
+    ``docutils.core.publish_string`` builds a new publisher, option parser,
+    settings, reader and parser on every call.  A ``TextRenderer`` builds
+    those once and reuses them for every call to ``render``, which makes
+    converting many small documents much cheaper.  A single instance can
+    be shared between threads.
+    """
+
+    def __init__(self, settings_overrides=None):
+        self._parser = Parser()
+        self._reader = Reader(parser=self._parser)
+        self._writer = TextWriter()
+        self._settings = self._get_settings(settings_overrides)
+        # The rst parser keeps its state machine on the instance while
+        # parsing so only one document can be parsed at a time.
+        self._lock = threading.Lock()
+
+    def _get_settings(self, settings_overrides):
+        components = (self._parser, self._reader, self._writer)
+        if hasattr(frontend, 'get_default_settings'):
+            settings = frontend.get_default_settings(*components)
+        else:
+            settings = frontend.OptionParser(
+                components=components).get_default_values()
+        if settings_overrides:
+            settings._update(settings_overrides, 'loose')
+        return settings
+
+    def render(self, contents):
+        """Renders a ReST string or utf-8 encoded bytes as plain text.
+
+        :param contents: The ReST to convert.
+        :rtype: str
+        :returns: The plain text version of the document.
+        """
+        if isinstance(contents, bytes):
+            contents = contents.decode('utf-8')
+        document = utils.new_document('<string>', self._settings)
+        with self._lock:
+            self._parser.parse(contents, document)
+        document.transformer.populate_from_components(
+            (self._reader, self._parser, self._writer))
+        document.transformer.apply_transforms()
+        visitor = TextTranslator(document)
+        document.walkabout(visitor)
+        return visitor.body
+
+
 class TextTranslator(nodes.NodeVisitor):
     sectionchars = '*=-~"+`'
 
@@ -0,0 +1,250 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Quick structural checks of generated ReST.
+
+These checks catch the mistakes the ReST written by ``ReSTStyle`` is
+most likely to contain, with a single pass over each line, instead of
+parsing the document with docutils.  They are not a full ReST parser.
+"""
+import re
+from collections import namedtuple
+
+import six
+
+
+ValidationProblem = namedtuple('ValidationProblem',
+                               ['path', 'line', 'message'])
+
+HEADING_CHARS = '*=-~^"+`#'
+_BORDER_RE = re.compile(r'^([%s])\1+$' % re.escape(HEADING_CHARS))
+# Inline markup has to start after whitespace or some punctuation and
+# end before whitespace or some punctuation.
+_START = r'(?:^|(?<=[\s\-:/\'"<(\[{]))'
+_END = r'(?=$|[\s\-.,:;!?\\/\'")\]}>])'
+_LITERAL_RE = re.compile(_START + r'``\S(?:.*?\S)?``' + _END)
+_STRONG_RE = re.compile(_START + r'\*\*\S(?:.*?\S)?\*\*' + _END)
+_EMPHASIS_RE = re.compile(
+    _START + r'(?<!\\)\*[^\s*](?:.*?[^\s\\])?\*' + _END)
+_UNCLOSED = [
+    (re.compile(_START + r'``(?=\S)'), 'inline literal'),
+    (re.compile(_START + r'\*\*(?=\S)'), 'strong'),
+    (re.compile(_START + r'(?<!\\)\*(?=[^\s*])'), 'emphasis'),
+]
+_REFERENCE_RE = re.compile(r'(?<![:`])`((?:[^`\\]|\\.)+?)`_(?!_)')
+_TARGET_RE = re.compile(r'^\s*\.\. _((?:[^:\\]|\\.)+):(?:\s|$)')
+_BULLET_RE = re.compile(r'^([*+-]|#\.|\d+\.) ')
+
+
+def _normalize_refname(name):
+    return ' '.join(name.replace('\\:', ':').split()).lower()
+
+
+def _indentation(line):
+    return len(line) - len(line.lstrip(' '))
+
+
+def validate(value, path=None, link_targets=None):
+    """Checks generated ReST for structural problems.
+
+    :param value: The ReST as a string or utf-8 encoded bytes.
+    :param path: The section path to report problems with.
+    :param link_targets: Names of link targets defined elsewhere, e.g.
+        the ``hrefs`` of a document.  Targets defined in the value itself
+        are always known.
+    :rtype: list
+    :returns: A ``ValidationProblem`` for each problem found.
+    """
+    validator = _Validator(link_targets)
+    validator.check(value, path)
+    validator.check_references()
+    return validator.problems
+
+
+def validate_sections(sections, link_targets=None):
+    """Checks each section of a flushed document structure.
+
+    :param sections: An iterable of ``(path, value)`` pairs as returned
+        by ``DocumentStructure.flush_sections``.
+    :param link_targets: Names of link targets that will be defined.
+    :rtype: list
+    """
+    validator = _Validator(link_targets)
+    for path, value in sections:
+        validator.check(value, path)
+    validator.check_references()
+    return validator.problems
+
+
+class _Validator(object):
+    def __init__(self, link_targets=None):
+        self.problems = []
+        self._targets = set()
+        for name in link_targets or []:
+            self._targets.add(_normalize_refname(name))
+        self._references = []
+
+    def _add_problem(self, path, line, message):
+        self.problems.append(ValidationProblem(path, line, message))
+
+    def check(self, value, path=None):
+        if isinstance(value, six.binary_type):
+            value = value.decode('utf-8')
+        lines = value.split('\n')
+        paragraph = []
+        literal_indent = None
+        previous_blank = True
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                self._check_paragraph(paragraph, path)
+                paragraph = []
+                previous_blank = True
+                continue
+            indent = _indentation(line)
+            if literal_indent is not None:
+                if indent > literal_indent:
+                    # Literal blocks are not checked.
+                    previous_blank = False
+                    continue
+                literal_indent = None
+                if not previous_blank:
+                    self._add_problem(path, number,
+                                      'Literal block ends without a blank '
+                                      'line')
+            if previous_blank and paragraph == [] and self._ends_literal(
+                    lines, number - 2):
+                literal_indent = self._literal_indent
+                if indent > literal_indent:
+                    previous_blank = False
+                    continue
+                literal_indent = None
+            paragraph.append((number, line))
+            previous_blank = False
+        self._check_paragraph(paragraph, path)
+
+    def _ends_literal(self, lines, index):
+        # Whether the paragraph before the blank lines ending at index
+        # introduces a literal block.
+        while index >= 0 and not lines[index].strip():
+            index -= 1
+        if index < 0 or not lines[index].rstrip().endswith('::'):
+            return False
+        if lines[index].lstrip().startswith('.. '):
+            # Directives other than literal blocks have checked content.
+            return False
+        # The literal block has to be indented more than the paragraph.
+        start = index
+        while start > 0 and lines[start - 1].strip():
+            start -= 1
+        self._literal_indent = _indentation(lines[start])
+        return True
+
+    def _check_paragraph(self, paragraph, path):
+        if not paragraph:
+            return
+        self._check_headings(paragraph, path)
+        self._check_indentation(paragraph, path)
+        for number, line in paragraph:
+            match = _TARGET_RE.match(line)
+            if match:
+                self._targets.add(_normalize_refname(match.group(1)))
+            elif not (line.lstrip().startswith('.. ') or
+                      _BORDER_RE.match(line)):
+                self._check_inline(line, number, path)
+
+    def _check_headings(self, paragraph, path):
+        lines = [line for number, line in paragraph]
+        if len(lines) == 3 and _BORDER_RE.match(lines[0]):
+            if lines[2] != lines[0]:
+                self._add_problem(path, paragraph[2][0],
+                                  'Heading underline does not match its '
+                                  'overline')
+            elif len(lines[0]) < len(lines[1].strip()):
+                self._add_problem(path, paragraph[0][0],
+                                  'Heading border is shorter than its '
+                                  'text %r' % lines[1].strip())
+        elif len(lines) == 2 and _BORDER_RE.match(lines[1]):
+            if len(lines[1]) < len(lines[0].strip()):
+                self._add_problem(path, paragraph[1][0],
+                                  'Heading underline is shorter than its '
+                                  'text %r' % lines[0].strip())
+
+    def _check_indentation(self, paragraph, path):
+        first_number, first_line = paragraph[0]
+        if first_line.lstrip().startswith('.. '):
+            # Directive options and content are indented freely.
+            return
+        allowed = [_indentation(first_line)]
+        # The indentation of the terms of definition lists.
+        terms = []
+        # The indentation of a line continuing the text of the last one.
+        text_indent = None
+        for index in range(1, len(paragraph)):
+            number, line = paragraph[index]
+            previous = paragraph[index - 1][1]
+            indent = _indentation(line)
+            previous_indent = _indentation(previous)
+            stripped = previous.lstrip()
+            bullet = _BULLET_RE.match(stripped)
+            # A line starts a block unless it continues the text of the
+            # line before it, and a block's first line followed by more
+            # indented lines is the term of a definition list.
+            starts_block = (text_indent != previous_indent or
+                            bool(_BORDER_RE.match(previous)))
+            text_indent = previous_indent
+            if bullet:
+                text_indent += len(bullet.group())
+            if indent > previous_indent:
+                if bullet and indent == text_indent:
+                    allowed.append(indent)
+                elif stripped.rstrip().endswith('::'):
+                    allowed.append(indent)
+                elif starts_block:
+                    allowed.append(indent)
+                    terms.append(text_indent)
+                else:
+                    self._add_problem(path, number, 'Unexpected indentation')
+                    return
+            elif indent not in allowed:
+                self._add_problem(path, number, 'Unexpected unindent')
+                return
+            elif indent < previous_indent and indent in terms:
+                following = paragraph[index + 1:index + 2]
+                if not (following and
+                        _indentation(following[0][1]) > indent):
+                    self._add_problem(path, number,
+                                      'Definition list ends without a '
+                                      'blank line')
+                    return
+
+    def _check_inline(self, line, number, path):
+        text = _LITERAL_RE.sub('', line)
+        text = _STRONG_RE.sub('', text)
+        text = _EMPHASIS_RE.sub('', text)
+        text = _BULLET_RE.sub('', text.lstrip())
+        for unclosed_re, name in _UNCLOSED:
+            if unclosed_re.search(text):
+                self._add_problem(path, number,
+                                  'Unbalanced %s markup' % name)
+                return
+        for match in _REFERENCE_RE.finditer(_LITERAL_RE.sub('', line)):
+            name = match.group(1)
+            if name.startswith('<') or name.endswith('>'):
+                # Anonymous inline links carry their own target.
+                continue
+            self._references.append((path, number, name))
+
+    def check_references(self):
+        for path, number, name in self._references:
+            if _normalize_refname(name) not in self._targets:
+                self._add_problem(path, number,
+                                  'Link %r has no target' % name)
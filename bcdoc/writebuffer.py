@@ -0,0 +1,223 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from array import array
+from bisect import bisect_right
+
+import six
+
+
+class WriteBuffer(object):
+    """Holds the writes of a document, merging small strings into chunks.
+
+    Documents write many tiny strings so keeping each of them as its own
+    list entry costs far more memory than the text itself.  The buffer
+    keeps the most recent writes as they were written and merges older
+    writes into larger chunks, remembering only the length of each
+    merged write so it can still be peeked at, popped and amended.
+
+    Positions in the buffer, as returned by ``tell`` and used by
+    ``delete`` and ``slice``, count writes the same way indices into a
+    list of the writes would.  Writes that are not strings are never
+    merged.
+    """
+
+    # The number of recent writes kept unmerged after the older ones are
+    # merged, and how many may build up before that happens.
+    keep_recent = 4
+    max_recent = 64
+    # Strings are merged into the last chunk until it reaches this size.
+    chunk_size = 4096
+
+    def __init__(self, writes=None):
+        self._chunks = []
+        # The position of the first write merged into each chunk.
+        self._firsts = []
+        # The length of each merged write, 1 for writes that are not
+        # strings.
+        self._lengths = array('l')
+        self._recent = []
+        # How many more documents share the buffer besides its owner.
+        self._shares = 0
+        if writes is not None:
+            for write in writes:
+                self.append(write)
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield chunk
+        for write in self._recent:
+            yield write
+
+    def iter_writes(self):
+        """Yields every write as it was written."""
+        for write in self._split(0):
+            yield write
+        for write in self._recent:
+            yield write
+
+    def _split(self, index):
+        # Yields the writes merged into the chunks from index on.
+        lengths = self._lengths
+        for i in range(index, len(self._chunks)):
+            chunk = self._chunks[i]
+            if not isinstance(chunk, six.string_types):
+                yield chunk
+                continue
+            if i + 1 < len(self._firsts):
+                last = self._firsts[i + 1]
+            else:
+                last = len(lengths)
+            offset = 0
+            for j in range(self._firsts[i], last):
+                yield chunk[offset:offset + lengths[j]]
+                offset += lengths[j]
+
+    def append(self, write):
+        recent = self._recent
+        recent.append(write)
+        if len(recent) > self.max_recent:
+            merged = recent[:-self.keep_recent]
+            del recent[:-self.keep_recent]
+            self._merge(merged)
+
+    def _merge(self, writes):
+        strings = []
+        for write in writes:
+            if isinstance(write, six.string_types):
+                strings.append(write)
+                continue
+            self._add_strings(strings)
+            strings = []
+            self._firsts.append(len(self._lengths))
+            self._chunks.append(write)
+            self._lengths.append(1)
+        self._add_strings(strings)
+
+    def _add_strings(self, strings):
+        if not strings:
+            return
+        text = ''.join(strings)
+        chunks = self._chunks
+        if (chunks and isinstance(chunks[-1], six.string_types) and
+                len(chunks[-1]) < self.chunk_size):
+            chunks[-1] += text
+        else:
+            self._firsts.append(len(self._lengths))
+            chunks.append(text)
+        self._lengths.extend(len(s) for s in strings)
+
+    def share(self):
+        """Returns the buffer for another document to share.
+
+        The buffer is shared until one of the documents sharing it calls
+        ``unshared`` to change it.
+        """
+        self._shares += 1
+        return self
+
+    def unshared(self):
+        """Returns a buffer that can be changed by its caller.
+
+        The buffer itself is returned when no other document shares it,
+        otherwise a copy of it.  Copying is cheap since the merged chunks
+        themselves are strings shared by both copies.
+        """
+        if not self._shares:
+            return self
+        self._shares -= 1
+        copy = WriteBuffer()
+        copy._chunks = list(self._chunks)
+        copy._firsts = list(self._firsts)
+        copy._lengths = array('l', self._lengths)
+        copy._recent = list(self._recent)
+        return copy
+
+    def peek(self):
+        """Returns the most recent write."""
+        if self._recent:
+            return self._recent[-1]
+        if self._chunks:
+            chunk = self._chunks[-1]
+            if not isinstance(chunk, six.string_types):
+                return chunk
+            return chunk[len(chunk) - self._lengths[-1]:]
+        raise IndexError('peek from empty write buffer')
+
+    def pop(self):
+        """Removes and returns the most recent write."""
+        if self._recent:
+            return self._recent.pop()
+        if not self._chunks:
+            raise IndexError('pop from empty write buffer')
+        chunk = self._chunks[-1]
+        length = self._lengths.pop()
+        if len(self._lengths) == self._firsts[-1]:
+            self._chunks.pop()
+            self._firsts.pop()
+            return chunk
+        split = len(chunk) - length
+        self._chunks[-1] = chunk[:split]
+        return chunk[split:]
+
+    def tell(self):
+        """Returns the position of the end of the buffer."""
+        return len(self._lengths) + len(self._recent)
+
+    def _chunk_index(self, position):
+        # Returns the index of the chunk holding the write at position.
+        if position >= len(self._lengths):
+            return len(self._chunks)
+        return bisect_right(self._firsts, position) - 1
+
+    def slice(self, start, end):
+        """Returns the writes between the start and end positions."""
+        if start >= end:
+            return []
+        index = self._chunk_index(start)
+        if index < len(self._chunks):
+            position = self._firsts[index]
+        else:
+            position = len(self._lengths)
+        writes = []
+        for write in self._iter_from(index):
+            if position >= end:
+                break
+            if position >= start:
+                writes.append(write)
+            position += 1
+        return writes
+
+    def _iter_from(self, index):
+        for write in self._split(index):
+            yield write
+        for write in self._recent:
+            yield write
+
+    def delete(self, start, end):
+        """Deletes the writes between the start and end positions."""
+        if start >= end:
+            return
+        index = self._chunk_index(start)
+        if index < len(self._chunks):
+            position = self._firsts[index]
+        else:
+            position = len(self._lengths)
+        writes = list(self._iter_from(index))
+        del self._chunks[index:]
+        del self._firsts[index:]
+        del self._lengths[position:]
+        self._recent = []
+        for write in writes:
+            if position < start or position >= end:
+                self.append(write)
+            position += 1
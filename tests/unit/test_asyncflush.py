@@ -0,0 +1,150 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import sys
+
+from tests import unittest
+from bcdoc.normalizer import WhitespaceNormalizer
+from bcdoc.restdoc import DocumentStructure
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+def _write_later(loop, text):
+    # Returns a render function writing text once the loop gets to it.
+    def render(section):
+        future = loop.create_future()
+        future.add_done_callback(lambda f: section.write(f.result()))
+        loop.call_soon(future.set_result, text)
+        return future
+    return render
+
+
+class _WriteWhenAwaited(object):
+    # An awaitable that only writes to the section once it is awaited.
+    def __init__(self, section, text):
+        self.section = section
+        self.text = text
+
+    def __await__(self):
+        self.section.write(self.text)
+        return
+        yield
+
+
+@unittest.skipIf(sys.version_info < (3, 6), 'aflush requires Python 3.6')
+class TestAsyncFlush(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def anext(self, chunks):
+        return self.loop.run_until_complete(chunks.__anext__())
+
+    def collect(self, chunks):
+        collected = []
+        while True:
+            try:
+                collected.append(self.anext(chunks))
+            except StopAsyncIteration:
+                return collected
+
+    def build(self):
+        doc = DocumentStructure('foo')
+        doc.hrefs['bar'] = 'http://example.com'
+        doc.write('Foo ')
+        doc.add_new_section('one').include_doc_string('<p>One `bar`_</p>')
+        doc.add_lazy_section('two', lambda section: section.write('Two'))
+        return doc
+
+    def test_same_value_as_flush_page(self):
+        chunks = self.collect(self.build().aflush())
+        self.assertEqual(b''.join(chunks), self.build().flush_page(0))
+        self.assertTrue(chunks[-1].endswith(b'.. _bar: http://example.com\n'))
+        self.assertNotIn(b'', chunks)
+
+    def test_root_streams_before_later_sections_are_rendered(self):
+        rendered = []
+        doc = self.build()
+        doc.add_lazy_section('three', lambda s: rendered.append(s.name))
+        chunks = doc.aflush()
+        self.assertEqual(self.anext(chunks), b'Foo ')
+        self.assertEqual(rendered, [])
+        self.collect(chunks)
+        self.assertEqual(rendered, ['three'])
+
+    def test_awaits_lazy_sections(self):
+        doc = DocumentStructure('foo')
+        doc.write('Foo ')
+        doc.add_lazy_section('bar', _write_later(self.loop, 'Bar'))
+        self.assertEqual(b''.join(self.collect(doc.aflush())), b'Foo Bar')
+
+    def test_streams_before_later_sections_are_rendered(self):
+        rendered = []
+        doc = DocumentStructure('foo')
+        section = doc.add_new_section('bar')
+        section.write('Bar')
+        section.add_lazy_section(
+            'baz', lambda s: (rendered.append(s.name), s.write('Baz')))
+        chunks = section.aflush()
+        self.assertEqual(self.anext(chunks), b'Bar')
+        self.assertEqual(rendered, [])
+        self.assertEqual(self.collect(chunks), [b'Baz'])
+        self.assertEqual(rendered, ['baz'])
+
+    def test_yields_to_loop_between_sections(self):
+        ticks = []
+        seen = []
+        doc = DocumentStructure('foo')
+        for name in ('a', 'b', 'c'):
+            doc.add_lazy_section(name, lambda s: seen.append(len(ticks)))
+
+        # Count how often the loop got a turn while flushing.
+        def tick():
+            ticks.append(1)
+            self.loop.call_soon(tick)
+        self.loop.call_soon(tick)
+        self.collect(doc.aflush())
+        self.assertEqual(len(seen), 3)
+        self.assertTrue(seen[0] < seen[1] < seen[2], seen)
+
+    def test_normalizer(self):
+        doc = DocumentStructure('foo')
+        doc.write('Foo   \n\n\n\n')
+        doc.add_new_section('bar').write('Bar')
+        chunks = self.collect(doc.aflush(normalizer=WhitespaceNormalizer()))
+        self.assertEqual(b''.join(chunks), b'Foo\n\nBar')
+
+    def test_async_section_cannot_be_flushed_synchronously(self):
+        doc = DocumentStructure('foo')
+        doc.add_lazy_section(
+            'bar', lambda section: _WriteWhenAwaited(section, 'Bar'))
+        with self.assertRaises(ValueError):
+            doc.flush_structure()
+        # The section can still be flushed asynchronously afterwards.
+        self.assertEqual(b''.join(self.collect(doc.aflush())), b'Bar')
+
+
+class TestLazySection(unittest.TestCase):
+    def test_written_when_flushed(self):
+        doc = DocumentStructure('foo')
+        rendered = []
+        section = doc.add_lazy_section(
+            'bar', lambda s: (rendered.append(s), s.write('Bar')))
+        self.assertEqual(rendered, [])
+        self.assertEqual(doc.flush_structure(), b'Bar')
+        self.assertEqual(rendered, [section])
+        self.assertEqual(doc.flush_structure(), b'Bar')
+        self.assertEqual(len(rendered), 1)
@@ -0,0 +1,139 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import json
+
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import urlopen
+
+from tests import unittest
+from bcdoc.docserver import DocServer, SectionCache
+
+
+class TestSectionCache(unittest.TestCase):
+    def test_least_recently_used_evicted(self):
+        cache = SectionCache(max_entries=2)
+        cache.put(('a',), b'a')
+        cache.put(('b',), b'b')
+        self.assertEqual(cache.get(('a',)), b'a')
+        cache.put(('c',), b'c')
+        self.assertNotIn(('b',), cache)
+        self.assertIsNone(cache.get(('b',)))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_max_bytes(self):
+        cache = SectionCache(max_entries=None, max_bytes=5)
+        cache.put(('a',), b'aaa')
+        cache.put(('b',), b'bb')
+        self.assertEqual(cache.stats()['bytes'], 5)
+        cache.put(('c',), b'c')
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn(('a',), cache)
+        # Pages over the limit on their own are not cached.
+        cache.put(('d',), b'dddddd')
+        self.assertNotIn(('d',), cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_replace(self):
+        cache = SectionCache()
+        cache.put(('a',), b'aaa')
+        cache.put(('a',), b'a')
+        self.assertEqual(cache.stats()['bytes'], 1)
+        self.assertEqual(cache.get(['a']), b'a')
+
+    def test_missing_pages(self):
+        cache = SectionCache()
+        cache.put(('a',), None)
+        self.assertIn(('a',), cache)
+        self.assertIsNone(cache.get(('a',), b'default'))
+        self.assertEqual(cache.get(('b',), b'default'), b'default')
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_peek_is_not_counted(self):
+        cache = SectionCache()
+        cache.put(('a',), b'a')
+        self.assertEqual(cache.peek(('a',)), b'a')
+        self.assertIsNone(cache.peek(('b',)))
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(cache.stats()['misses'], 0)
+
+
+class TestDocServer(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.server = DocServer(cache=SectionCache(max_entries=10))
+        self.server.register('s3', self.write_s3)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def write_s3(self, doc):
+        self.calls.append(doc.name)
+        doc.style.h1('S3')
+        for name in ('get_object', 'put_object'):
+            doc.add_lazy_section(name, self.write_operation)
+
+    def write_operation(self, section):
+        self.calls.append(section.name)
+        section.style.h2(section.name)
+        section.include_doc_string('<p>Calls %s</p>' % section.name)
+
+    def get(self, path):
+        response = urlopen(self.server.url + path)
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def test_serves_pages_of_flush_pages(self):
+        expected = self.server.get_page(('s3', 'get_object'))
+        self.assertIn(b'Calls get_object', expected)
+        self.assertEqual(self.get('/s3/get_object'), expected)
+        self.assertNotIn(b'get_object', self.get('/s3'))
+
+    def test_only_requested_page_written(self):
+        self.get('/s3/get_object')
+        self.assertEqual(self.calls, ['s3', 'get_object'])
+        self.get('/s3')
+        self.assertEqual(self.calls, ['s3', 'get_object', 's3'])
+
+    def test_pages_written_once(self):
+        self.get('/s3/get_object')
+        self.get('/s3/get_object')
+        self.get('/s3')
+        self.assertEqual(self.calls, ['s3', 'get_object', 's3'])
+        stats = json.loads(self.get('/_stats').decode('utf-8'))
+        self.assertEqual(stats['renders'], 2)
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_rewritten_after_eviction(self):
+        self.server.cache.max_entries = 1
+        self.get('/s3/get_object')
+        self.get('/s3/put_object')
+        self.get('/s3/get_object')
+        self.assertEqual(self.calls, ['s3', 'get_object', 's3', 'put_object',
+                                      's3', 'get_object'])
+
+    def test_unknown_page(self):
+        for path in ('/', '/ec2', '/s3/missing'):
+            with self.assertRaises(HTTPError) as context:
+                self.get(path)
+            self.assertEqual(context.exception.code, 404)
+
+    def test_missing_page_cached(self):
+        for i in range(2):
+            self.assertIsNone(self.server.get_page(('s3', 'missing')))
+        self.assertEqual(self.calls, ['s3'])
+        self.assertEqual(self.server.stats()['misses'], 1)
@@ -20,10 +20,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 #
+import json
+import os
+import shutil
+import tempfile
+
 import six
 
 from tests import unittest
-from bcdoc.restdoc import ReSTDocument, DocumentStructure
+from bcdoc.restdoc import ReSTDocument, DocumentStructure, LinkTargetRegistry
+from bcdoc.style import HTMLStyle, TextStyle
 
 
 class TestReSTDocument(unittest.TestCase):
@@ -38,6 +44,14 @@ class TestReSTDocument(unittest.TestCase):
         doc.writeln('foo')
         self.assertEqual(doc.getvalue(), six.b('foo\n'))
 
+    def test_writelines(self):
+        doc = ReSTDocument()
+        doc.style.indent()
+        doc.writelines(['foo', '', 'bar'])
+        doc.writelines(iter([]))
+        self.assertEqual(doc.getvalue(), six.b('  foo\n  \n  bar\n'))
+        self.assertEqual(len(doc._writes._recent), 1)
+
     def test_include_doc_string(self):
         doc = ReSTDocument()
         doc.include_doc_string('<p>this is a <code>test</code></p>')
@@ -50,6 +64,39 @@ class TestReSTDocument(unittest.TestCase):
         doc.remove_last_doc_string()
         self.assertEqual(doc.getvalue(), six.b('foo\n'))
 
+    def test_include_doc_string_chunks(self):
+        doc_string = '<p>this is a <code>test</code> of chunks</p>'
+        doc = ReSTDocument()
+        doc.include_doc_string(doc_string)
+        expected = doc.getvalue()
+        for size in range(1, 8):
+            doc = ReSTDocument()
+            doc.include_doc_string(
+                doc_string[i:i + size]
+                for i in range(0, len(doc_string), size))
+            self.assertEqual(doc.getvalue(), expected)
+
+    def test_include_doc_string_file(self):
+        doc = ReSTDocument()
+        doc.include_doc_string(six.BytesIO(
+            u'<p>caf\u00e9 <b>bold</b></p>'.encode('utf-8')))
+        self.assertEqual(doc.getvalue(),
+                         u'\n\ncaf\u00e9 **bold** \n\n'.encode('utf-8'))
+
+    def test_include_doc_string_bytes_split_in_characters(self):
+        doc_string = u'<p>caf\u00e9</p>'.encode('utf-8')
+        doc = ReSTDocument()
+        doc.include_doc_string([doc_string[:7], doc_string[7:]])
+        self.assertEqual(doc.getvalue(),
+                         u'\n\ncaf\u00e9\n\n'.encode('utf-8'))
+
+    def test_remove_chunked_doc_string(self):
+        doc = ReSTDocument()
+        doc.writeln('foo')
+        doc.include_doc_string(['<p>this is ', 'a test</p>'])
+        doc.remove_last_doc_string()
+        self.assertEqual(doc.getvalue(), six.b('foo\n'))
+
 
 class TestDocumentStructure(unittest.TestCase):
     def setUp(self):
@@ -132,3 +179,986 @@ class TestDocumentStructure(unittest.TestCase):
             self.doc_structure.available_sections,
             ['mysection', 'mysection2']
         )
+
+    def test_sections_use_style_class(self):
+        doc_structure = DocumentStructure(self.name, style_class=TextStyle)
+        section = doc_structure.add_new_section('mysection')
+        self.assertIsInstance(section.style, TextStyle)
+        doc_structure.style.h1('Title')
+        section.write('contents')
+        self.assertEqual(doc_structure.flush_structure(),
+                         six.b('\nTitle\n*****\n\ncontents\n'))
+
+    def test_flush_pages(self):
+        self.doc_structure.writeln('1')
+        section = self.doc_structure.add_new_section('mysection')
+        section.writeln('2')
+        subsection = section.add_new_section('mysubsection')
+        subsection.writeln('3')
+        page = subsection.add_new_section('mypage')
+        page.writeln('4')
+        page.add_new_section('mypagesection').writeln('5')
+        second_section = self.doc_structure.add_new_section('mysection2')
+        second_section.writeln('6')
+        pages = self.doc_structure.flush_pages(depth=3)
+        self.assertEqual(list(pages.items()), [
+            (('mydoc',), six.b('1\n2\n3\n6\n')),
+            (('mydoc', 'mysection', 'mysubsection', 'mypage'),
+             six.b('4\n5\n')),
+        ])
+
+    def test_flush_pages_single_page(self):
+        self.doc_structure.writeln('1')
+        self.doc_structure.add_new_section('mysection').writeln('2')
+        pages = self.doc_structure.flush_pages(depth=0)
+        self.assertEqual(list(pages.items()), [(('mydoc',), six.b('1\n2\n'))])
+
+    def test_flush_page(self):
+        self.doc_structure.writeln('1')
+        section = self.doc_structure.add_new_section('mysection')
+        section.writeln('2')
+        rendered = []
+        section.add_lazy_section(
+            'mypage', lambda s: (rendered.append(s), s.writeln('3')))
+        self.assertEqual(self.doc_structure.flush_page(depth=2),
+                         six.b('1\n2\n'))
+        self.assertEqual(rendered, [])
+        page = section.get_section('mypage')
+        self.assertEqual(page.flush_page(depth=0), six.b('3\n'))
+        self.assertEqual(rendered, [page])
+
+    def test_flush_pages_hrefs(self):
+        section = self.doc_structure.add_new_section('mysection')
+        section.hrefs['foo'] = 'www.foo.com'
+        pages = self.doc_structure.flush_pages()
+        for value in pages.values():
+            self.assertIn(six.b('.. _foo: www.foo.com'), value)
+        self.assertEqual(self.doc_structure.flush_structure(),
+                         six.b('\n\n.. _foo: www.foo.com\n'))
+
+    def test_flush_sections(self):
+        self.doc_structure.writeln('1')
+        section = self.doc_structure.add_new_section('mysection')
+        section.writeln('2')
+        section.add_new_section('mysubsection').writeln('3')
+        self.assertEqual(list(self.doc_structure.flush_sections()), [
+            (('mydoc',), six.b('1\n')),
+            (('mydoc', 'mysection'), six.b('2\n')),
+            (('mydoc', 'mysection', 'mysubsection'), six.b('3\n')),
+        ])
+
+
+class TestMultiTargetDocumentStructure(unittest.TestCase):
+    def write_document(self, doc):
+        doc.style.h1('Title')
+        doc.style.toctree()
+        doc.style.tocitem('foo')
+        doc.style.hidden_toctree()
+        doc.style.hidden_tocitem('bar')
+        section = doc.add_new_section('mysection')
+        section.include_doc_string('<p>See <a href="http://a.com">a</a></p>')
+        section.style.sphinx_reference_label('label', 'text')
+        section.style.bold('shared')
+
+    def test_flush_targets_matches_single_target(self):
+        doc = DocumentStructure('mydoc', targets=['man', 'html'])
+        self.write_document(doc)
+        flushed = doc.flush_targets()
+        self.assertEqual(list(flushed), ['man', 'html'])
+        for target in ['man', 'html']:
+            single = DocumentStructure('mydoc', target=target)
+            self.write_document(single)
+            self.assertEqual(flushed[target], single.flush_structure())
+
+    def test_target_defaults_to_first_target(self):
+        doc = DocumentStructure('mydoc', targets=['html', 'man'])
+        self.assertEqual(doc.target, 'html')
+        section = doc.add_new_section('mysection')
+        self.assertEqual(section.targets, ['html', 'man'])
+        section.style.sphinx_reference_label('foo')
+        self.assertEqual(doc.flush_structure(), six.b(':ref:`foo <foo>`'))
+        self.assertEqual(doc.flush_structure('man'), six.b('foo'))
+
+    def test_identical_output_is_shared(self):
+        doc = ReSTDocument(targets=['man', 'html'])
+        doc.style.sphinx_reference_label('foo')
+        doc.style.hidden_tocitem('foo')
+        doc.style.tocitem('foo', file_name='foo')
+        self.assertEqual(len(list(doc._writes)), 3)
+        doc = ReSTDocument(targets=['man', 'man'])
+        doc.style.sphinx_reference_label('foo')
+        self.assertEqual(list(doc._writes), ['foo'])
+
+    def test_amend_forked_write(self):
+        doc = ReSTDocument(targets=['man', 'html'])
+        doc.style.start_bold()
+        doc.style.sphinx_reference_label('foo ')
+        doc.style.end_bold()
+        self.assertEqual(doc.getvalue('man'), six.b('**foo** '))
+        self.assertEqual(doc.getvalue('html'),
+                         six.b('**:ref:`foo  <foo >`** '))
+
+    def write_forked_link(self, targets, text):
+        doc = ReSTDocument(targets=targets)
+        doc.style.start_a(attrs=[('href', 'http://example.com')])
+        doc.style.sphinx_reference_label('foo', text)
+        doc.style.end_a()
+        return doc
+
+    def test_link_text_forked_write(self):
+        targets = ['man', 'html']
+        doc = self.write_forked_link(targets, 'bar')
+        # Only the text of the document's own target is a link target.
+        self.assertEqual(doc.hrefs, {'bar': 'http://example.com'})
+        self.assertEqual(doc.getvalue('man'), six.b(
+            '`bar`_ \n\n.. _bar: http://example.com\n'))
+        doc = self.write_forked_link(targets, 'bar')
+        self.assertEqual(doc.getvalue('html'), six.b(
+            '`\\:ref\\:`bar <foo>` <http://example.com>`__ \n\n'
+            '.. _bar: http://example.com\n'))
+
+    def test_link_text_forked_write_empty_for_a_target(self):
+        targets = ['html', 'man']
+        doc = self.write_forked_link(targets, '')
+        self.assertEqual(doc.hrefs,
+                         {r'\:ref\:` <foo>`': 'http://example.com'})
+        doc.style.bold('after')
+        self.assertEqual(doc.getvalue('man'), six.b(
+            '`<http://example.com>`_ **after** \n\n'
+            '.. _\\:ref\\:` <foo>`: http://example.com\n'))
+        doc = self.write_forked_link(targets, '')
+        self.assertEqual(doc.getvalue('html'), six.b(
+            '`\\:ref\\:` <foo>``_ \n\n'
+            '.. _\\:ref\\:` <foo>`: http://example.com\n'))
+
+
+class TestDeferredDocStrings(unittest.TestCase):
+    def setUp(self):
+        self.doc_structure = DocumentStructure('mydoc')
+        self.doc_structure.defer_doc_strings = True
+        self.fed = []
+
+    def record_feeds(self, doc):
+        feed = doc.parser.feed
+
+        def record_feed(data):
+            self.fed.append(data)
+            feed(data)
+        doc.parser.feed = record_feed
+
+    def test_matches_immediate_parsing(self):
+        doc_string = (
+            '<p>A <b>bold</b> <a href="http://a.com">link</a></p>'
+            '<note>a note</note>')
+        immediate = DocumentStructure('mydoc')
+        for doc in [immediate, self.doc_structure]:
+            section = doc.add_new_section('mysection')
+            section.style.indent()
+            section.include_doc_string(doc_string)
+            section.style.dedent()
+            section.writeln('after')
+        self.assertEqual(self.doc_structure.flush_structure(),
+                         immediate.flush_structure())
+
+    def test_doc_string_starting_with_stray_end_tag(self):
+        values = []
+        for defer in [False, True]:
+            doc = ReSTDocument()
+            doc.defer_doc_strings = defer
+            doc.write('before ')
+            doc.include_doc_string('<p>one <b>two</b></p>')
+            doc.include_doc_string('</b>three <i>four</i> five')
+            values.append(doc.getvalue())
+        self.assertEqual(values[1], values[0])
+        self.assertIn(six.b('** three *four* five'), values[1])
+
+    def test_doc_string_not_parsed_until_flushed(self):
+        section = self.doc_structure.add_new_section('mysection')
+        self.assertTrue(section.defer_doc_strings)
+        self.record_feeds(section)
+        section.include_doc_string('<p>foo</p>')
+        self.assertEqual(self.fed, [])
+        section.flush_structure()
+        self.assertEqual(self.fed, ['<p>foo</p>'])
+
+    def test_removed_doc_strings_are_not_parsed(self):
+        section = self.doc_structure.add_new_section('mysection')
+        section.writeln('foo')
+        section.include_doc_string('<p>removed</p>')
+        section.remove_last_doc_string()
+        deleted = self.doc_structure.add_new_section('deleted')
+        deleted.include_doc_string('<p>deleted</p>')
+        self.record_feeds(section)
+        self.record_feeds(deleted)
+        self.doc_structure.delete_section('deleted')
+        self.assertEqual(self.doc_structure.flush_structure(),
+                         six.b('foo\n'))
+        self.assertEqual(self.fed, [])
+
+    def test_getvalue_parses_doc_strings(self):
+        doc = ReSTDocument()
+        doc.defer_doc_strings = True
+        doc.include_doc_string('<p>this is a <code>test</code></p>')
+        self.assertEqual(doc.getvalue(), six.b('\n\nthis is a ``test`` \n\n'))
+
+    def test_remove_doc_string_after_it_was_parsed(self):
+        doc = ReSTDocument()
+        doc.defer_doc_strings = True
+        doc.write('abc ')
+        doc.include_doc_string('<p>hello world</p>')
+        doc.getvalue()
+        doc.remove_last_doc_string()
+        self.assertEqual(doc.getvalue(), six.b('abc '))
+
+    def test_remove_doc_string_after_earlier_one_was_parsed(self):
+        doc = ReSTDocument()
+        doc.defer_doc_strings = True
+        doc.include_doc_string('<p>deferred</p>')
+        doc.write('abc ')
+        doc.include_doc_string(['<p>streamed</p>'])
+        doc.getvalue()
+        doc.remove_last_doc_string()
+        self.assertEqual(doc.getvalue(), six.b('\n\ndeferred\n\nabc '))
+
+    def test_style_amends_deferred_doc_string(self):
+        doc = ReSTDocument()
+        doc.defer_doc_strings = True
+        doc.style.start_bold()
+        doc.include_doc_string('foo ')
+        doc.style.end_bold()
+        self.assertEqual(doc.getvalue(), six.b('**foo** '))
+
+
+class TestReSTDocumentWriteBuffer(unittest.TestCase):
+    def test_remove_doc_string_after_writes_are_merged(self):
+        doc = ReSTDocument()
+        for i in range(100):
+            doc.write('%s ' % i)
+        doc.include_doc_string('<p>this is a <b>test</b></p>' * 20)
+        for i in range(100):
+            doc.write('%s ' % i)
+        doc.remove_last_doc_string()
+        expected = ''.join('%s ' % i for i in range(100)) * 2
+        self.assertEqual(doc.getvalue(), six.b(expected))
+
+    def test_remove_doc_string_that_amended_earlier_write(self):
+        doc = ReSTDocument()
+        doc.include_doc_string('<b>x ')
+        doc.include_doc_string('</b>')
+        doc.remove_last_doc_string()
+        self.assertEqual(doc.getvalue(), six.b('**x'))
+        doc = ReSTDocument()
+        doc.include_doc_string(' ')
+        doc.include_doc_string('</code>')
+        doc.remove_last_doc_string()
+        self.assertEqual(doc.getvalue(), six.b(''))
+
+
+class TestSpilledDocumentStructure(unittest.TestCase):
+    def write_document(self, doc):
+        doc.writeln('intro')
+        for i in range(3):
+            section = doc.add_new_section('section%s' % i)
+            section.include_doc_string(
+                '<p>A <a href="http://a%s">l</a></p>' % i)
+            section.add_new_section('sub').writeln('sub%s' % i)
+            section.mark_complete()
+        doc.writeln('outro')
+
+    def test_flush_matches_in_memory(self):
+        expected = DocumentStructure('mydoc')
+        self.write_document(expected)
+        doc = DocumentStructure('mydoc')
+        doc.enable_spilling()
+        self.write_document(doc)
+        self.assertEqual(doc.flush_structure(), expected.flush_structure())
+
+    def test_completed_sections_are_emptied(self):
+        doc = DocumentStructure('mydoc')
+        doc.enable_spilling()
+        section = doc.add_new_section('mysection')
+        section.add_new_section('sub').writeln('foo')
+        section.mark_complete()
+        self.assertEqual(section.available_sections, [])
+        self.assertEqual(section.getvalue(), six.b(''))
+        self.assertEqual(doc.flush_structure(), six.b('foo\n'))
+
+    def test_memory_limit(self):
+        doc = DocumentStructure('mydoc')
+        doc.enable_spilling(memory_limit=10)
+        section = doc.add_new_section('mysection')
+        section.writeln('x' * 5)
+        section.mark_complete()
+        self.assertFalse(doc.spill_file.on_disk)
+        section = doc.add_new_section('mysection2')
+        section.writeln('y' * 20)
+        section.mark_complete()
+        self.assertTrue(doc.spill_file.on_disk)
+        self.assertEqual(list(doc.iter_structure()),
+                         [six.b(''), six.b('xxxxx\n'), six.b(''),
+                          six.b('y' * 20 + '\n'), six.b('')])
+
+    def test_spill_all_targets(self):
+        doc = DocumentStructure('mydoc', targets=['man', 'html'])
+        doc.enable_spilling()
+        section = doc.add_new_section('mysection')
+        section.style.sphinx_reference_label('foo')
+        section.mark_complete()
+        self.assertEqual(doc.flush_targets(),
+                         {'man': six.b('foo'),
+                          'html': six.b(':ref:`foo <foo>`')})
+
+    def test_mark_complete_without_spilling(self):
+        section = DocumentStructure('mydoc').add_new_section('mysection')
+        section.writeln('foo')
+        section.mark_complete()
+        self.assertEqual(section.getvalue(), six.b('foo\n'))
+
+
+class TestDocumentStructureDigests(unittest.TestCase):
+    def create_document(self):
+        doc = DocumentStructure('mydoc')
+        doc.writeln('root')
+        for name in ['a', 'b']:
+            section = doc.add_new_section(name)
+            section.writeln(name)
+            section.add_new_section('sub').writeln('%s sub' % name)
+        return doc
+
+    def test_digest_is_stable(self):
+        self.assertEqual(self.create_document().digest(),
+                         self.create_document().digest())
+
+    def test_digest_updates_on_write(self):
+        doc = self.create_document()
+        root_digest = doc.digest()
+        section = doc.get_section('a')
+        section_digest = section.digest()
+        other_digest = doc.get_section('b').digest()
+        section.get_section('sub').write('more')
+        self.assertNotEqual(doc.digest(), root_digest)
+        self.assertNotEqual(section.digest(), section_digest)
+        self.assertEqual(doc.get_section('b').digest(), other_digest)
+
+    def test_digest_updates_on_structure_changes(self):
+        doc = self.create_document()
+        digest = doc.digest()
+        doc.add_new_section('c')
+        added_digest = doc.digest()
+        self.assertNotEqual(added_digest, digest)
+        doc.delete_section('c')
+        self.assertEqual(doc.digest(), digest)
+        doc.get_section('a').include_doc_string('<p>foo</p>')
+        self.assertNotEqual(doc.digest(), digest)
+        doc.get_section('a').remove_last_doc_string()
+        self.assertEqual(doc.digest(), digest)
+
+    def test_unchanged_sections_are_not_rehashed(self):
+        doc = self.create_document()
+        doc.digest()
+        doc.get_section('a').write('more')
+        self.assertEqual(doc._digests, {})
+        self.assertEqual(doc.get_section('a')._digests, {})
+        self.assertNotEqual(doc.get_section('b')._digests, {})
+
+    def test_changed_sections(self):
+        doc = self.create_document()
+        other = self.create_document()
+        self.assertEqual(doc.changed_sections(other), [])
+        other.get_section('b').get_section('sub').write('more')
+        other.add_new_section('c')
+        doc.get_section('a').delete_section('sub')
+        self.assertEqual(doc.changed_sections(other), [
+            ('mydoc',), ('mydoc', 'a'), ('mydoc', 'a', 'sub'),
+            ('mydoc', 'b'), ('mydoc', 'b', 'sub'), ('mydoc', 'c')])
+
+    def test_changed_sections_against_manifest(self):
+        doc = self.create_document()
+        manifest = json.loads(json.dumps(doc.digest_manifest()))
+        self.assertEqual(doc.changed_sections(manifest), [])
+        doc.get_section('b').write('more')
+        self.assertEqual(doc.changed_sections(manifest),
+                         [('mydoc',), ('mydoc', 'b')])
+
+    def test_digest_kept_when_spilled(self):
+        doc = self.create_document()
+        doc.enable_spilling()
+        digest = doc.digest()
+        doc.get_section('a').mark_complete()
+        self.assertEqual(doc.digest(), digest)
+
+
+class TestWritePages(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def create_document(self, method_doc='method'):
+        doc = DocumentStructure('s3', target='html')
+        doc.writeln('S3')
+        for name in ['client', 'bucket']:
+            section = doc.add_new_section(name)
+            section.writeln(name)
+            section.add_new_section('method').writeln(method_doc)
+        return doc
+
+    def read(self, *path):
+        with open(os.path.join(self.output_dir, *path), 'rb') as f:
+            return f.read()
+
+    def test_write_pages(self):
+        written = self.create_document().write_pages(self.output_dir)
+        self.assertEqual(list(written.values()), [True, True, True])
+        self.assertEqual(
+            self.read('s3.rst'),
+            six.b('S3\n\n\n\n.. toctree::\n  :maxdepth: 1\n  :titlesonly:\n\n'
+                  '  s3/client\n  s3/bucket\n'))
+        self.assertEqual(self.read('s3', 'client.rst'),
+                         six.b('client\nmethod\n'))
+        self.assertEqual(self.read('s3', 'bucket.rst'),
+                         six.b('bucket\nmethod\n'))
+
+    def test_unchanged_pages_are_not_written(self):
+        self.create_document().write_pages(self.output_dir)
+        written = self.create_document().write_pages(self.output_dir)
+        self.assertEqual(list(written.values()), [False, False, False])
+        doc = self.create_document()
+        doc.get_section('bucket').write('changed')
+        written = doc.write_pages(self.output_dir)
+        self.assertEqual(list(written.values()), [False, False, True])
+        self.assertEqual(self.read('s3', 'bucket.rst'),
+                         six.b('bucket\nchangedmethod\n'))
+
+    def test_write_html_pages(self):
+        doc = DocumentStructure('s3', target='html', style_class=HTMLStyle)
+        doc.write('S3')
+        doc.add_new_section('client').write('client')
+        doc.write_pages(self.output_dir, extension='.html')
+        self.assertEqual(self.read('s3.html').count(six.b('</ul>')), 1)
+        self.assertEqual(doc.getvalue(), six.b('S3'))
+
+    def test_write_pages_at_depth(self):
+        written = self.create_document().write_pages(
+            self.output_dir, depth=2, extension='.txt')
+        self.assertEqual(list(written), [
+            os.path.join(self.output_dir, 's3.txt'),
+            os.path.join(self.output_dir, 's3', 'client', 'method.txt'),
+            os.path.join(self.output_dir, 's3', 'bucket', 'method.txt'),
+        ])
+        self.assertIn(six.b('  s3/client/method\n'), self.read('s3.txt'))
+
+
+class TestLinkTargetRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = LinkTargetRegistry('/links.txt')
+
+    def create_document(self, name, hrefs):
+        doc = DocumentStructure(name)
+        doc.link_registry = self.registry
+        section = doc.add_new_section('mysection')
+        section.writeln('section contents')
+        section.hrefs.update(hrefs)
+        return doc
+
+    def test_shared_link_targets(self):
+        first = self.create_document('first', {'foo': 'www.foo.com'})
+        second = self.create_document('second', {'foo': 'www.foo.com'})
+        for doc in (first, second):
+            contents = doc.flush_structure()
+            self.assertIn(six.b('.. include:: /links.txt'), contents)
+            self.assertNotIn(six.b('.. _foo:'), contents)
+        self.assertEqual(self.registry.getvalue(),
+                         six.b('.. _foo: www.foo.com\n'))
+
+    def test_conflicting_link_target_stays_local(self):
+        self.create_document('first', {'foo': 'www.foo.com'}).flush_structure()
+        contents = self.create_document(
+            'second', {'Foo': 'www.bar.com'}).flush_structure()
+        self.assertNotIn(six.b('.. include::'), contents)
+        self.assertIn(six.b('.. _Foo: www.bar.com'), contents)
+        self.assertEqual(self.registry.items(), [('foo', 'www.foo.com')])
+
+    def test_conflicting_link_target_with_shared_one(self):
+        self.create_document('first', {'foo': 'www.foo.com',
+                                       'bar': 'www.bar.com'}).flush_structure()
+        contents = self.create_document(
+            'second', {'foo': 'www.baz.com',
+                       'bar': 'www.bar.com'}).flush_structure()
+        self.assertNotIn(six.b('.. include::'), contents)
+        self.assertIn(six.b('.. _foo: www.baz.com'), contents)
+        self.assertIn(six.b('.. _bar: www.bar.com'), contents)
+
+    def test_style_that_cannot_include_files(self):
+        doc = DocumentStructure('first', style_class=TextStyle)
+        doc.link_registry = self.registry
+        doc.hrefs['foo'] = 'www.foo.com'
+        with self.assertRaises(ValueError):
+            doc.flush_structure()
+
+    def test_write(self):
+        self.create_document('first', {'foo': 'www.foo.com'}).flush_structure()
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        filename = os.path.join(output_dir, 'links.txt')
+        self.assertTrue(self.registry.write(filename))
+        self.assertFalse(self.registry.write(filename))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), six.b('.. _foo: www.foo.com\n'))
+
+
+class TestTocTree(unittest.TestCase):
+    def setUp(self):
+        self.doc_structure = DocumentStructure('mydoc')
+
+    def test_toc_tree(self):
+        self.doc_structure.style.h1('Title')
+        second = self.doc_structure.add_new_section('second')
+        first = self.doc_structure.add_new_section('first')
+        # Sections are indexed in document order, not in write order.
+        second.style.h2('Second')
+        first.style.h2('First')
+        first.style.start_sphinx_py_class('Client')
+        method = first.add_new_section('method')
+        method.style.start_sphinx_py_method('get', 'Key')
+        self.assertEqual(self.doc_structure.toc_tree(), [{
+            'title': 'Title', 'level': 1, 'kind': 'heading',
+            'path': ('mydoc',), 'children': [{
+                'title': 'Second', 'level': 2, 'kind': 'heading',
+                'path': ('mydoc', 'second'), 'children': []
+            }, {
+                'title': 'First', 'level': 2, 'kind': 'heading',
+                'path': ('mydoc', 'first'), 'children': [{
+                    'title': 'Client', 'level': 4, 'kind': 'class',
+                    'path': ('mydoc', 'first'), 'children': [{
+                        'title': 'get', 'level': 5, 'kind': 'method',
+                        'path': ('mydoc', 'first', 'method'),
+                        'children': []
+                    }]
+                }]
+            }]
+        }])
+
+    def test_toc_tree_max_level(self):
+        self.doc_structure.style.h2('Title')
+        section = self.doc_structure.add_new_section('mysection')
+        section.style.h3('Subtitle')
+        section.style.start_sphinx_py_class('Client')
+        tree = self.doc_structure.toc_tree(max_level=2)
+        self.assertEqual(tree[0]['title'], 'Title')
+        self.assertEqual(tree[0]['children'], [])
+        self.assertEqual(section.toc_tree()[0]['title'], 'Subtitle')
+
+    def test_deleted_sections_are_not_indexed(self):
+        section = self.doc_structure.add_new_section('mysection')
+        section.style.h1('Title')
+        self.doc_structure.delete_section('mysection')
+        self.assertEqual(self.doc_structure.toc_tree(), [])
+
+    def test_completed_sections_keep_their_entries(self):
+        self.doc_structure.enable_spilling()
+        self.addCleanup(self.doc_structure.spill_file.close)
+        section = self.doc_structure.add_new_section('mysection')
+        section.add_new_section('subsection').style.h2('Subtitle')
+        section.mark_complete()
+        tree = self.doc_structure.toc_tree()
+        self.assertEqual(tree[0]['path'], ('mydoc', 'mysection',
+                                           'subsection'))
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.doc_structure = DocumentStructure('mydoc')
+
+    def test_rollback_writes_and_style_state(self):
+        doc = ReSTDocument()
+        doc.write('foo')
+        checkpoint = doc.checkpoint()
+        doc.style.indent()
+        doc.style.do_p = False
+        doc.keep_data = False
+        doc.keep_data = True
+        doc.write('bar')
+        doc.style.bold('baz')
+        doc.rollback(checkpoint)
+        self.assertEqual(doc.style.indentation, 0)
+        self.assertTrue(doc.style.do_p)
+        self.assertEqual(doc.getvalue(), b'foo')
+
+    def test_rollback_restores_popped_writes(self):
+        doc = ReSTDocument()
+        for i in range(100):
+            doc.write('foo ')
+        checkpoint = doc.checkpoint()
+        # Ending inline markup amends the write before it.
+        doc.style.end_bold()
+        doc.pop_write()
+        doc.pop_write()
+        doc.rollback(checkpoint)
+        self.assertEqual(doc.getvalue(), b'foo ' * 100)
+
+    def test_commit(self):
+        doc = ReSTDocument()
+        checkpoint = doc.checkpoint()
+        doc.write('foo')
+        doc.commit(checkpoint)
+        self.assertEqual(doc.getvalue(), b'foo')
+        with self.assertRaises(ValueError):
+            doc.rollback(checkpoint)
+
+    def test_nested_checkpoints(self):
+        doc = ReSTDocument()
+        outer = doc.checkpoint()
+        doc.write('foo')
+        inner = doc.checkpoint()
+        doc.write('bar')
+        doc.rollback(inner)
+        doc.write('baz')
+        self.assertEqual(doc.getvalue(), b'foobaz')
+        inner = doc.checkpoint()
+        doc.write('qux')
+        doc.rollback(outer)
+        self.assertEqual(doc.getvalue(), b'')
+        with self.assertRaises(ValueError):
+            doc.commit(inner)
+
+    def test_rollback_hrefs(self):
+        self.doc_structure.hrefs['foo'] = 'www.foo.com'
+        checkpoint = self.doc_structure.checkpoint()
+        self.doc_structure.include_doc_string(
+            '<a href="www.bar.com">bar</a>')
+        section = self.doc_structure.add_new_section('mysection')
+        section.hrefs['foo'] = 'www.other.com'
+        self.doc_structure.rollback(checkpoint)
+        self.assertEqual(self.doc_structure.hrefs, {'foo': 'www.foo.com'})
+        self.assertIsNone(self.doc_structure.hrefs.journal)
+
+    def test_rollback_sections(self):
+        first = self.doc_structure.add_new_section('first')
+        first.write('first')
+        self.doc_structure.add_new_section('second').write('second')
+        checkpoint = self.doc_structure.checkpoint()
+        first.write(' changed')
+        first.add_new_section('nested').write('nested')
+        self.doc_structure.delete_section('second')
+        self.doc_structure.add_new_section('third').write('third')
+        self.doc_structure.rollback(checkpoint)
+        self.assertEqual(self.doc_structure.available_sections,
+                         ['first', 'second'])
+        self.assertEqual(first.available_sections, [])
+        self.assertEqual(self.doc_structure.flush_structure(),
+                         b'firstsecond')
+
+    def test_commit_sections(self):
+        section = self.doc_structure.add_new_section('mysection')
+        checkpoint = self.doc_structure.checkpoint()
+        section.write('foo')
+        self.doc_structure.commit(checkpoint)
+        self.assertEqual(section._checkpoints, [])
+        self.assertEqual(self.doc_structure.flush_structure(), b'foo')
+
+    def test_sections_checkpointed_when_changed(self):
+        first = self.doc_structure.add_new_section('first')
+        second = self.doc_structure.add_new_section('second')
+        checkpoint = self.doc_structure.checkpoint()
+        self.assertEqual(first._checkpoints, [])
+        self.assertEqual(second._checkpoints, [])
+        second.write('foo')
+        self.assertEqual(first._checkpoints, [])
+        self.assertEqual(len(second._checkpoints), 1)
+        self.doc_structure.rollback(checkpoint)
+        self.assertEqual(second._checkpoints, [])
+        self.assertEqual(self.doc_structure.flush_structure(), b'')
+
+    def test_rollback_section_indentation(self):
+        section = self.doc_structure.add_new_section('mysection')
+        checkpoint = self.doc_structure.checkpoint()
+        section.style.indent()
+        self.doc_structure.rollback(checkpoint)
+        self.assertEqual(section.style.indentation, 0)
+
+    def test_rollback_restores_section_order(self):
+        for name in ['first', 'second', 'third']:
+            self.doc_structure.add_new_section(name).write(name)
+        checkpoint = self.doc_structure.checkpoint()
+        self.doc_structure.delete_section('second')
+        self.doc_structure.add_new_section('second').write('new')
+        self.doc_structure.rollback(checkpoint)
+        self.assertEqual(self.doc_structure.available_sections,
+                         ['first', 'second', 'third'])
+        self.assertEqual(self.doc_structure.flush_structure(),
+                         b'firstsecondthird')
+
+    def test_rollback_outer_checkpoint(self):
+        section = self.doc_structure.add_new_section('mysection')
+        section.write('foo')
+        outer = self.doc_structure.checkpoint()
+        inner = self.doc_structure.checkpoint()
+        section.write('bar')
+        self.doc_structure.commit(inner)
+        self.doc_structure.rollback(outer)
+        self.assertEqual(self.doc_structure.flush_structure(), b'foo')
+
+    def test_rollback_checkpoint_of_section(self):
+        section = self.doc_structure.add_new_section('mysection')
+        subsection = section.add_new_section('subsection')
+        outer = self.doc_structure.checkpoint()
+        section.write('foo')
+        inner = section.checkpoint()
+        subsection.write('bar')
+        self.doc_structure.rollback(outer)
+        self.assertEqual(self.doc_structure.flush_structure(), b'')
+        self.assertEqual(self.doc_structure._tree_checkpoints, [])
+        with self.assertRaises(ValueError):
+            section.rollback(inner)
+
+    def test_rollback_last_doc_string(self):
+        self.doc_structure.include_doc_string('<p>foo</p>')
+        checkpoint = self.doc_structure.checkpoint()
+        self.doc_structure.remove_last_doc_string()
+        self.doc_structure.include_doc_string('<p>bar</p>')
+        self.doc_structure.rollback(checkpoint)
+        self.assertEqual(self.doc_structure.flush_structure(),
+                         b'\n\nfoo\n\n')
+        self.doc_structure.remove_last_doc_string()
+        self.assertEqual(self.doc_structure.flush_structure(), b'')
+
+    def test_rollback_deferred_doc_strings(self):
+        self.doc_structure.defer_doc_strings = True
+        self.doc_structure.include_doc_string('<p>foo</p>')
+        checkpoint = self.doc_structure.checkpoint()
+        self.doc_structure.write('bar')
+        self.doc_structure.getvalue()
+        self.doc_structure.rollback(checkpoint)
+        self.doc_structure.remove_last_doc_string()
+        self.assertEqual(self.doc_structure.flush_structure(), b'')
+
+    def test_rollback_toc_entries(self):
+        checkpoint = self.doc_structure.checkpoint()
+        self.doc_structure.style.h1('Title')
+        self.doc_structure.rollback(checkpoint)
+        self.assertEqual(self.doc_structure.toc_tree(), [])
+
+    def test_rollback_after_writing_for_targets(self):
+        doc = ReSTDocument(targets=['man', 'html'])
+        doc.write('foo')
+        checkpoint = doc.checkpoint()
+
+        def write_func():
+            doc.write('bar')
+            doc.pop_write()
+        doc.write_for_targets(write_func)
+        doc.write('baz')
+        doc.rollback(checkpoint)
+        self.assertEqual(doc.getvalue(), b'foo')
+
+    def test_rollback_after_parsing_deferred_doc_strings(self):
+        doc = ReSTDocument()
+        doc.defer_doc_strings = True
+        doc.style.bold('b')
+        doc.include_doc_string('plain <i>it</i>')
+        writes = list(doc._writes)
+        checkpoint = doc.checkpoint()
+        doc._parse_deferred_doc_strings()
+        doc.rollback(checkpoint)
+        self.assertEqual(list(doc._writes), writes)
+
+    def test_rollback_section_then_root(self):
+        root = DocumentStructure('root', section_names=['a', 'b'])
+        section = root.get_section('a')
+        section.write('foo ')
+        section_checkpoint = section.checkpoint()
+        section.write('bar ')
+        section.add_new_section('nested').write('nested ')
+        root.hrefs['foo'] = 'www.foo.com'
+        root_checkpoint = root.checkpoint()
+        section.rollback(section_checkpoint)
+        self.assertEqual(root.flush_structure(), b'foo ')
+        section.include_doc_string('<ul><li>x</li></ul>')
+        root.get_section('b').write('b')
+        root.rollback(root_checkpoint)
+        self.assertEqual(section.available_sections, ['nested'])
+        self.assertEqual(root.hrefs, {'foo': 'www.foo.com'})
+        self.assertIsNone(root.hrefs.journal)
+        self.assertEqual(root._tree_checkpoints, [])
+        self.assertEqual(b''.join(root._iter_flush(None)),
+                         b'foo bar nested ')
+
+
+class TestClonedSections(unittest.TestCase):
+    def write_shape(self, section):
+        section.style.new_paragraph()
+        section.write('Tag')
+        section.style.indent()
+        section.style.new_paragraph()
+        section.write('- Key')
+        member = section.add_new_section('member')
+        member.style.new_paragraph()
+        member.include_doc_string('<p>The <b>key</b> of the tag.</p>')
+        section.style.dedent()
+
+    def create_parent(self, name, indentation):
+        doc = DocumentStructure(name)
+        for i in range(indentation):
+            doc.style.indent()
+        doc.write('before')
+        return doc
+
+    def test_clone_matches_a_rewritten_section(self):
+        source = self.create_parent('source', 1)
+        self.write_shape(source.add_new_section('shape'))
+        expected = self.create_parent('other', 3)
+        self.write_shape(expected.add_new_section('copy'))
+        doc = self.create_parent('other', 3)
+        clone = doc.add_cloned_section('copy', source.get_section('shape'))
+        self.assertEqual(clone.path, ['other', 'copy'])
+        self.assertEqual(clone.get_section('member').path,
+                         ['other', 'copy', 'member'])
+        self.assertEqual(doc.flush_structure(), expected.flush_structure())
+
+    def test_clone_at_a_lower_indentation(self):
+        source = self.create_parent('source', 3)
+        self.write_shape(source.add_new_section('shape'))
+        expected = self.create_parent('other', 0)
+        self.write_shape(expected.add_new_section('copy'))
+        doc = self.create_parent('other', 0)
+        doc.add_cloned_section('copy', source.get_section('shape'))
+        self.assertEqual(doc.flush_structure(), expected.flush_structure())
+
+    def test_clone_of_section_starting_with_text(self):
+        source = DocumentStructure('source')
+        section = source.add_new_section('section')
+        section.writeln('foo')
+        section.writeln('bar')
+        section.add_new_section('subsection').writeln('baz')
+        doc = DocumentStructure('other')
+        doc.style.indent()
+        doc.add_cloned_section('copy', section)
+        self.assertEqual(doc.flush_structure(), b'  foo\n  bar\n  baz\n')
+        self.assertEqual(doc.flush_pages()[('other', 'copy')],
+                         b'  foo\n  bar\n  baz\n')
+
+    def test_clone_continuing_a_line(self):
+        source = DocumentStructure('source')
+        section = source.add_new_section('section')
+        section.write('foo\n')
+        section.writeln('bar')
+        doc = DocumentStructure('other')
+        doc.style.indent()
+        doc.write('before ')
+        doc.add_cloned_section('copy', section)
+        self.assertEqual(doc.flush_structure(), b'before foo\n  bar\n')
+
+    def test_writes_are_copied_on_write(self):
+        source = self.create_parent('source', 0)
+        shape = source.add_new_section('shape')
+        self.write_shape(shape)
+        doc = self.create_parent('other', 1)
+        clone = doc.add_cloned_section('copy', shape)
+        self.assertIs(clone._writes, shape._writes)
+        clone.write(' clone')
+        self.assertIsNot(clone._writes, shape._writes)
+        shape_value = shape.getvalue()
+        shape.write(' shape')
+        self.assertTrue(clone.getvalue().endswith(b' clone'))
+        self.assertNotIn(b'shape', clone.getvalue())
+        self.assertEqual(shape.getvalue(), shape_value + b' shape')
+
+    def test_clone_copies_hrefs_and_toc_entries(self):
+        source = DocumentStructure('source')
+        shape = source.add_new_section('shape')
+        shape.style.h2('Tag')
+        shape.include_doc_string('<a href="http://tag.com">tag</a>')
+        doc = DocumentStructure('other')
+        doc.add_cloned_section('copy', shape)
+        self.assertEqual(doc.hrefs, {'tag': 'http://tag.com'})
+        self.assertEqual(doc.toc_tree()[0]['path'], ('other', 'copy'))
+
+
+class TestSectionPathIndex(unittest.TestCase):
+    def setUp(self):
+        self.doc_structure = DocumentStructure('mydoc')
+        self.section = self.doc_structure.add_new_section('mysection')
+        self.subsection = self.section.add_new_section('subsection')
+        self.other = self.doc_structure.add_new_section('other')
+
+    def test_get_section_by_path(self):
+        get = self.doc_structure.get_section_by_path
+        self.assertIs(get(('mydoc',)), self.doc_structure)
+        self.assertIs(get(['mydoc', 'mysection', 'subsection']),
+                      self.subsection)
+        # Any section in the tree can look up any other.
+        self.assertIs(self.other.get_section_by_path(
+            ('mydoc', 'mysection', 'subsection')), self.subsection)
+        with self.assertRaises(KeyError):
+            get(('mydoc', 'missing'))
+
+    def test_get_sections_by_prefix(self):
+        self.assertEqual(
+            [path for path, section in
+             self.doc_structure.get_sections_by_prefix()],
+            [('mydoc',), ('mydoc', 'mysection'),
+             ('mydoc', 'mysection', 'subsection'), ('mydoc', 'other')])
+        self.assertEqual(
+            list(self.doc_structure.get_sections_by_prefix(
+                ('mydoc', 'mysection'))),
+            [(('mydoc', 'mysection'), self.section),
+             (('mydoc', 'mysection', 'subsection'), self.subsection)])
+
+    def test_delete_section_removes_subtree(self):
+        self.doc_structure.delete_section('mysection')
+        with self.assertRaises(KeyError):
+            self.doc_structure.get_section_by_path(
+                ('mydoc', 'mysection', 'subsection'))
+        # Sections added to a deleted section stay out of the index.
+        self.section.add_new_section('later')
+        with self.assertRaises(KeyError):
+            self.doc_structure.get_section_by_path(
+                ('mydoc', 'mysection', 'later'))
+
+    def test_replaced_section_is_reindexed(self):
+        section = self.doc_structure.add_new_section('mysection')
+        self.assertIs(self.doc_structure.get_section_by_path(
+            ('mydoc', 'mysection')), section)
+        with self.assertRaises(KeyError):
+            self.doc_structure.get_section_by_path(
+                ('mydoc', 'mysection', 'subsection'))
+
+    def test_rollback_restores_index(self):
+        checkpoint = self.doc_structure.checkpoint()
+        self.doc_structure.delete_section('mysection')
+        self.doc_structure.add_new_section('new')
+        self.doc_structure.rollback(checkpoint)
+        self.assertIs(self.doc_structure.get_section_by_path(
+            ('mydoc', 'mysection', 'subsection')), self.subsection)
+        with self.assertRaises(KeyError):
+            self.doc_structure.get_section_by_path(('mydoc', 'new'))
+
+    def test_paths_are_derived_from_parents(self):
+        for path, section in self.doc_structure.get_sections_by_prefix():
+            self.assertEqual(section.path, list(path))
+        self.assertIs(self.subsection.path, self.subsection.path)
+
+    def test_index_keys_share_parent_keys(self):
+        keys = dict(
+            (section.name, key) for key, section in
+            self.doc_structure._path_index.items())
+        self.assertEqual(keys['subsection'], (keys['mysection'], 'subsection'))
+        self.assertIs(keys['subsection'][0], keys['mysection'])
+
+    def test_detached_section_is_a_root(self):
+        self.doc_structure.delete_section('mysection')
+        self.assertIsNone(self.section._parent)
+        self.assertEqual(self.subsection.path, ['mysection', 'subsection'])
+        self.assertIs(self.section.get_section_by_path(
+            ('mysection', 'subsection')), self.subsection)
+
+    def test_set_root_path(self):
+        self.doc_structure.path = ['foo', 'mydoc']
+        self.assertEqual(self.subsection.path,
+                         ['foo', 'mydoc', 'mysection', 'subsection'])
+        self.assertIs(self.doc_structure.get_section_by_path(
+            ('foo', 'mydoc', 'mysection')), self.section)
+        with self.assertRaises(ValueError):
+            self.section.path = ['mysection']
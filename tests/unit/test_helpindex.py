@@ -0,0 +1,83 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import os
+import shutil
+import tempfile
+
+import six
+
+from tests import unittest
+from bcdoc.helpindex import (
+    HelpIndex, HelpIndexError, lookup_help, write_help_index)
+from bcdoc.restdoc import DocumentStructure
+
+
+class TestHelpIndex(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'help.idx')
+        doc = DocumentStructure('ec2')
+        doc.writeln('ec2 help')
+        self.pages = [
+            ('ec2', doc.flush_structure()),
+            (['ec2', 'describe-instances'], u'describe \u2713'),
+            ('s3 ls', lambda: 'ls help'),
+            ('empty', b''),
+        ]
+        write_help_index(self.filename, self.pages, '1.0')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_get_pages(self):
+        with HelpIndex(self.filename, '1.0') as index:
+            self.assertEqual(len(index), 4)
+            self.assertEqual(index.get('ec2'), six.b('ec2 help\n'))
+            self.assertEqual(index.get(['ec2', 'describe-instances']),
+                             u'describe \u2713'.encode('utf-8'))
+            self.assertEqual(index.get(['s3', 'ls']), six.b('ls help'))
+            self.assertEqual(index.get('empty'), six.b(''))
+            self.assertIsNone(index.get('s3'))
+            self.assertIsNone(index.get('zzz'))
+
+    def test_write_from_dict(self):
+        write_help_index(self.filename, {'foo': 'bar'}, '1.0')
+        with HelpIndex(self.filename, '1.0') as index:
+            self.assertEqual(index.get('foo'), six.b('bar'))
+
+    def test_stale_version(self):
+        with self.assertRaises(HelpIndexError):
+            HelpIndex(self.filename, '2.0')
+
+    def test_not_a_help_index(self):
+        with open(self.filename, 'wb') as f:
+            f.write(six.b('x' * 100))
+        with self.assertRaises(HelpIndexError):
+            HelpIndex(self.filename, '1.0')
+
+    def test_lookup_help(self):
+        def render():
+            raise AssertionError('Should not render')
+        self.assertEqual(lookup_help(self.filename, 'ec2', '1.0', render),
+                         six.b('ec2 help\n'))
+
+    def test_lookup_help_falls_back_to_rendering(self):
+        def render():
+            return u'live'
+        self.assertEqual(lookup_help(self.filename, 'ec2', '2.0', render),
+                         six.b('live'))
+        self.assertEqual(lookup_help(self.filename, 'iam', '1.0', render),
+                         six.b('live'))
+        missing = os.path.join(self.tempdir, 'missing.idx')
+        self.assertEqual(lookup_help(missing, 'ec2', '1.0', render),
+                         six.b('live'))
@@ -0,0 +1,90 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import json
+import os
+import subprocess
+import sys
+
+from tests import unittest
+from bcdoc.restdoc import ReSTDocument
+
+
+# Importing bcdoc.restdoc imported 37 modules that were not already
+# loaded by the interpreter, in about 27ms, when these were recorded.
+MODULE_BUDGET = 40
+IMPORT_TIME_BUDGET = 0.1
+# Heavy modules that should only be imported once documentation is
+# generated.
+DEFERRED_MODULES = ['asyncio', 'docutils', 'html.parser', 'HTMLParser',
+                    'multiprocessing', 'bcdoc.asyncflush',
+                    'bcdoc.docstringparser', 'bcdoc.spill',
+                    'bcdoc.validator']
+
+_IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+before = set(sys.modules)
+start = time.time()
+import bcdoc.restdoc
+elapsed = time.time() - start
+print(json.dumps({'elapsed': elapsed,
+                  'modules': sorted(set(sys.modules) - before)}))
+'''
+
+
+def _import_restdoc():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    # Import once beforehand, writing the byte code, so compiling the
+    # modules is not measured.
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    subprocess.check_call([sys.executable, '-c', 'import bcdoc.restdoc'],
+                          cwd=root, env=env)
+    output = subprocess.check_output([sys.executable, '-c', _IMPORT_SCRIPT],
+                                     cwd=root)
+    return json.loads(output.decode('utf-8'))
+
+
+class TestImportBudget(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.result = _import_restdoc()
+
+    def test_module_budget(self):
+        modules = self.result['modules']
+        self.assertTrue(
+            len(modules) <= MODULE_BUDGET,
+            'Importing bcdoc.restdoc imported %s modules, over the budget '
+            'of %s: %s' % (len(modules), MODULE_BUDGET, modules))
+
+    def test_deferred_modules(self):
+        modules = self.result['modules']
+        for name in DEFERRED_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_import_time_budget(self):
+        self.assertTrue(
+            self.result['elapsed'] <= IMPORT_TIME_BUDGET,
+            'Importing bcdoc.restdoc took %.3fs, over the budget of %ss'
+            % (self.result['elapsed'], IMPORT_TIME_BUDGET))
+
+
+class TestLazyParser(unittest.TestCase):
+    def test_parser_created_on_first_doc_string(self):
+        doc = ReSTDocument()
+        self.assertIsNone(doc._parser)
+        doc.include_doc_string('<p>foo</p>')
+        self.assertIsNotNone(doc._parser)
+        self.assertEqual(doc.getvalue(), b'\n\nfoo\n\n')
@@ -0,0 +1,128 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import io
+import mmap
+import os
+import shutil
+import tempfile
+
+from tests import unittest
+from bcdoc import literalref
+from bcdoc.literalref import LiteralReference
+from bcdoc.restdoc import DocumentStructure, ReSTDocument
+from bcdoc.style import TextStyle
+
+
+CODE = u'def foo():\n    return u"\u00e9t\u00e9"\n'
+
+
+class TestLiteralReference(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, 'code.py')
+        with open(self.filename, 'wb') as f:
+            f.write(CODE.encode('utf-8'))
+
+    def test_file_path(self):
+        ref = LiteralReference(self.filename, '  ')
+        self.assertEqual(ref.getvalue(),
+                         u'def foo():\n      return u"\u00e9t\u00e9"\n')
+
+    def test_callable(self):
+        ref = LiteralReference(lambda: u'a\nb', '  ')
+        self.assertEqual(ref.getvalue(), u'a\n  b\n')
+
+    def test_callable_returning_chunks(self):
+        ref = LiteralReference(lambda: iter([b'a\n', b'\nb\n']), '  ')
+        self.assertEqual(ref.getvalue(), u'a\n\n  b\n')
+
+    def test_file_like_object(self):
+        ref = LiteralReference(io.BytesIO(CODE.encode('utf-8')))
+        self.assertEqual(ref.getvalue(), CODE)
+
+    def test_mmap_region(self):
+        with open(self.filename, 'rb') as f:
+            region = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.addCleanup(region.close)
+        ref = LiteralReference(memoryview(region)[:10])
+        self.assertEqual(ref.getvalue(), u'def foo():\n')
+        self.assertEqual(LiteralReference(region).getvalue(), CODE)
+
+    def test_multibyte_character_split_across_reads(self):
+        original = literalref.READ_SIZE
+        self.addCleanup(setattr, literalref, 'READ_SIZE', original)
+        literalref.READ_SIZE = 1
+        ref = LiteralReference(CODE.encode('utf-8'), '  ')
+        self.assertEqual(ref.getvalue(),
+                         u'def foo():\n      return u"\u00e9t\u00e9"\n')
+
+
+class TestCodeblockReference(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, 'code.py')
+        with open(self.filename, 'wb') as f:
+            f.write(CODE.encode('utf-8'))
+
+    def test_only_reference_is_held(self):
+        doc = DocumentStructure('foo')
+        doc.style.codeblock_reference(self.filename)
+        refs = [w for w in doc._writes if isinstance(w, LiteralReference)]
+        self.assertEqual(len(refs), 1)
+        self.assertNotIn(u'def foo', u''.join(
+            w for w in doc._writes if not isinstance(w, LiteralReference)))
+
+    def test_flush_matches_inline_codeblock(self):
+        doc = DocumentStructure('foo')
+        doc.style.start_sphinx_py_method('foo')
+        doc.add_new_section('example').style.codeblock_reference(
+            self.filename)
+        doc.add_new_section('after').write('After')
+
+        expected = DocumentStructure('foo')
+        expected.style.start_sphinx_py_method('foo')
+        section = expected.add_new_section('example')
+        section.style.start_codeblock()
+        section.write(CODE.replace(u'\n    ', u'\n' + u' ' * 8))
+        section.style.end_codeblock()
+        expected.add_new_section('after').write('After')
+
+        self.assertEqual(doc.flush_structure(), expected.flush_structure())
+        self.assertIn(u'\u00e9t\u00e9'.encode('utf-8'),
+                      b''.join(doc.iter_structure()))
+
+    def test_source_read_at_flush(self):
+        reads = []
+
+        def source():
+            reads.append(1)
+            return u'print(1)'
+        doc = DocumentStructure('foo')
+        doc.style.codeblock_reference(source)
+        self.assertEqual(reads, [])
+        self.assertIn(b'print(1)', doc.flush_structure())
+        self.assertEqual(reads, [1])
+
+    def test_getvalue(self):
+        doc = ReSTDocument()
+        doc.style.codeblock_reference(lambda: u'a\nb')
+        self.assertEqual(doc.getvalue(), b'::\n\n  a\n  b\n\n\n')
+
+    def test_text_style(self):
+        doc = ReSTDocument(style_class=TextStyle)
+        doc.style.codeblock_reference(lambda: u'a\nb')
+        inline = ReSTDocument(style_class=TextStyle)
+        inline.style.codeblock(u'a\nb')
+        self.assertEqual(doc.getvalue(), inline.getvalue())
@@ -0,0 +1,106 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from tests import unittest
+from bcdoc.normalizer import WhitespaceNormalizer
+from bcdoc.restdoc import DocumentStructure
+from bcdoc.textwriter import TextRenderer
+
+
+class TestWhitespaceNormalizer(unittest.TestCase):
+    def setUp(self):
+        self.normalizer = WhitespaceNormalizer()
+
+    def test_collapses_blank_lines(self):
+        self.assertEqual(
+            self.normalizer.normalize(b'\n\nfoo  \n\n\n  \nbar\n\n\n'),
+            b'foo\n\nbar\n')
+        self.assertEqual(self.normalizer.bytes_saved, 10)
+
+    def test_keeps_literal_blocks(self):
+        value = b'Example::\n\n  a  \n\n\n  b\n\n\nafter\n'
+        self.assertEqual(self.normalizer.normalize(value),
+                         b'Example::\n\n  a  \n\n\n  b\n\nafter\n')
+
+    def test_keeps_literal_directives(self):
+        value = b'.. code-block:: python\n\n  a\n\n\n  b\n'
+        self.assertEqual(self.normalizer.normalize(value), value)
+
+    def test_keeps_literal_directives_with_options(self):
+        for value in [
+                b'.. code:: python\n   :class: foo\n\n   x = 1\n\n\n\n'
+                b'   y = 2\n',
+                b'.. parsed-literal::\n   :class: foo\n\n   x\n\n\n   y\n']:
+            self.assertEqual(self.normalizer.normalize(value), value)
+
+    def test_literal_directive_ends_at_its_indentation(self):
+        self.assertEqual(
+            self.normalizer.normalize(
+                b'.. code::\n   :class: foo\nafter\n\n   a\n\n\n   b\n'),
+            b'.. code::\n   :class: foo\nafter\n\n   a\n\n   b\n')
+
+    def test_collapses_other_directives(self):
+        self.assertEqual(
+            self.normalizer.normalize(b'.. note::\n\n  a\n\n\n  b\n'),
+            b'.. note::\n\n  a\n\n  b\n')
+
+    def test_keeps_escaped_whitespace(self):
+        self.assertEqual(self.normalizer.normalize(b'foo\\ \nbar  '),
+                         b'foo\\ \nbar')
+
+    def test_feed_in_chunks(self):
+        value = b'Example::\n\n  a  \n\n\n  b\n\n\nafter  \n\n\n'
+        chunks = [self.normalizer.feed(value[i:i + 3])
+                  for i in range(0, len(value), 3)]
+        chunks.append(self.normalizer.close())
+        self.assertEqual(b''.join(chunks),
+                         WhitespaceNormalizer().normalize(value))
+        self.assertEqual(self.normalizer.bytes_saved,
+                         len(value) - len(b''.join(chunks)))
+
+
+class TestNormalizedDocumentStructure(unittest.TestCase):
+    def create_document(self):
+        doc_structure = DocumentStructure('mydoc')
+        doc_structure.style.h1('Title')
+        section = doc_structure.add_new_section('mysection')
+        section.include_doc_string(
+            '<p>Some <b>bold</b> text</p><p>with <a href="http://a.com">'
+            'a link</a></p><ul><li>one</li><li>two</li></ul>')
+        section.style.new_paragraph()
+        section.write('::\n\n    a\n\n\n    b\n\n\n')
+        section.style.new_paragraph()
+        section.write('after')
+        return doc_structure
+
+    def test_flush_structure(self):
+        value = self.create_document().flush_structure()
+        normalizer = WhitespaceNormalizer()
+        normalized = self.create_document().flush_structure(
+            normalizer=normalizer)
+        self.assertTrue(normalizer.bytes_saved > 0)
+        self.assertEqual(len(value) - len(normalized),
+                         normalizer.bytes_saved)
+        self.assertNotIn(b'\n\n\n\n', normalized)
+        self.assertIn(b'a\n\n\n    b', normalized)
+        # The rendered document is unchanged.
+        renderer = TextRenderer()
+        self.assertEqual(renderer.render(normalized), renderer.render(value))
+
+    def test_getvalue(self):
+        section = self.create_document().get_section('mysection')
+        normalizer = WhitespaceNormalizer()
+        value = section.getvalue()
+        normalized = section.getvalue(normalizer=normalizer)
+        self.assertEqual(normalized, WhitespaceNormalizer().normalize(value))
+        self.assertEqual(len(value) - len(normalized),
+                         normalizer.bytes_saved)
@@ -0,0 +1,97 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import os
+import shutil
+import tempfile
+
+from tests import unittest
+from bcdoc.restdoc import DocumentStructure
+from bcdoc.searchindex import SearchIndex, SearchIndexError, tokenize
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add_text(('s3', 'get'), 'Gets an object from a bucket.')
+        self.index.add_text(('s3', 'put'), 'Puts an object in a bucket')
+        self.index.add_text(('s3', 'put'), 'The object is replaced.')
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize(u'Gets an S3_Object, quickly!'),
+                         ['gets', 'an', 's3_object', 'quickly'])
+
+    def test_search(self):
+        self.assertEqual(self.index.search('object'),
+                         [('s3', 'put'), ('s3', 'get')])
+        self.assertEqual(self.index.search('gets OBJECT'), [('s3', 'get')])
+        self.assertEqual(self.index.search('object', limit=1),
+                         [('s3', 'put')])
+        self.assertEqual(self.index.search('missing'), [])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_phrase_search(self):
+        self.assertEqual(self.index.search('object from', phrase=True),
+                         [('s3', 'get')])
+        self.assertEqual(self.index.search('from object', phrase=True), [])
+        # Text added separately is indexed as if it was written in one go.
+        self.assertEqual(self.index.search('bucket the', phrase=True),
+                         [('s3', 'put')])
+
+    def test_merge(self):
+        other = SearchIndex()
+        other.add_text(('s3', 'delete'), 'Deletes an object')
+        other.add_text(('s3', 'get'), 'It returns the object body')
+        self.index.merge(other)
+        self.assertEqual(self.index.search('object', limit=1),
+                         [('s3', 'get')])
+        self.assertEqual(self.index.search('deletes'), [('s3', 'delete')])
+        self.assertEqual(self.index.search('bucket it', phrase=True),
+                         [('s3', 'get')])
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'search.idx')
+        self.index.save(filename)
+        loaded = SearchIndex.load(filename)
+        self.assertEqual(len(loaded), len(self.index))
+        self.assertEqual(loaded.paths, self.index.paths)
+        self.assertEqual(loaded.search('object bucket'),
+                         self.index.search('object bucket'))
+        self.assertEqual(loaded.search('bucket the', phrase=True),
+                         [('s3', 'put')])
+
+    def test_load_invalid_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'search.idx')
+        with open(filename, 'wb') as f:
+            f.write(b'not an index')
+        with self.assertRaises(SearchIndexError):
+            SearchIndex.load(filename)
+
+
+class TestDocumentSearchIndex(unittest.TestCase):
+    def test_index_written_text(self):
+        doc = DocumentStructure('s3')
+        doc.search_index = SearchIndex()
+        doc.style.h1('Amazon S3')
+        section = doc.add_new_section('get_object')
+        section.style.start_sphinx_py_method('get_object')
+        section.include_doc_string('<p>Retrieves <b>objects</b></p>')
+        self.assertEqual(doc.search_index.search('s3'), [('s3',)])
+        self.assertEqual(doc.search_index.search('retrieves objects',
+                                                 phrase=True),
+                         [('s3', 'get_object')])
+        self.assertEqual(doc.search_index.search('get_object'),
+                         [('s3', 'get_object')])
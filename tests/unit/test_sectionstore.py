@@ -0,0 +1,76 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import os
+import shutil
+import tempfile
+
+import six
+
+from tests import unittest
+from bcdoc.restdoc import DocumentStructure
+from bcdoc.sectionstore import SectionStore
+
+
+class TestSectionStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tempdir, 'store')
+        self.store = SectionStore(self.directory)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+
+    def create_document(self, description):
+        doc = DocumentStructure('mydoc')
+        doc.style.h1('Title')
+        doc.add_new_section('description').writeln(description)
+        shape = doc.add_new_section('shape')
+        shape.writeln('Shared shape documentation ' * 20)
+        return doc
+
+    def test_put_and_get(self):
+        digest = self.store.put(six.b('foo'))
+        self.assertIn(digest, self.store)
+        self.assertEqual(self.store.get(digest), six.b('foo'))
+        self.assertEqual(self.store.put(six.b('foo')), digest)
+        self.assertEqual(len(self.store), 1)
+
+    def test_get_missing(self):
+        with self.assertRaises(KeyError):
+            self.store.get('missing')
+
+    def test_rebuild_documents(self):
+        first = self.create_document('first')
+        second = self.create_document('second')
+        first_manifest = self.store.add_document(first)
+        second_manifest = self.store.add_document(second)
+        self.assertEqual(self.store.get_document(first_manifest),
+                         self.create_document('first').flush_structure())
+        self.assertEqual(self.store.get_document(second_manifest),
+                         self.create_document('second').flush_structure())
+        # Only the description differs between the two documents.
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual(first_manifest[2], second_manifest[2])
+        self.assertEqual(self.store.get(first_manifest[1]),
+                         six.b('first\n'))
+
+    def test_reopen_store(self):
+        manifest = self.store.add_document(self.create_document('foo'))
+        self.store.close()
+        self.store = SectionStore(self.directory)
+        self.assertEqual(self.store.get_document(manifest),
+                         self.create_document('foo').flush_structure())
+        self.store.put(six.b('bar'))
+        self.assertEqual(self.store.get_document(manifest),
+                         self.create_document('foo').flush_structure())
@@ -24,7 +24,7 @@ import unittest
 
 import six
 
-from bcdoc.style import ReSTStyle
+from bcdoc.style import ReSTStyle, TextStyle, HTMLStyle
 from bcdoc.restdoc import ReSTDocument
 
 
@@ -44,6 +44,15 @@ class TestStyle(unittest.TestCase):
         style.dedent()
         self.assertEqual(style.spaces(), '')
 
+    def test_spaces_after_indent_width_changed(self):
+        style = ReSTStyle(None, 4)
+        style.indentation = 3
+        self.assertEqual(style.spaces(), ' ' * 12)
+        style.indent_width = 2
+        self.assertEqual(style.spaces(), ' ' * 6)
+        style.indentation = 1
+        self.assertEqual(style.spaces(), '  ')
+
     def test_bold(self):
         style = ReSTStyle(ReSTDocument())
         style.bold('foobar')
@@ -229,3 +238,151 @@ class TestStyle(unittest.TestCase):
         )
         style.write_py_doc_string(docstring)
         self.assertEqual(style.doc.getvalue(), six.b(docstring + '\n'))
+
+
+class TestTextStyle(unittest.TestCase):
+    def setUp(self):
+        self.doc = ReSTDocument(style_class=TextStyle)
+        self.style = self.doc.style
+
+    def test_inline_markup(self):
+        self.style.bold('foo')
+        self.style.italics('bar')
+        self.style.code('baz')
+        self.assertEqual(self.doc.getvalue(), six.b('**foo** *bar* "baz"\n'))
+
+    def test_heading(self):
+        self.style.h2('Title')
+        self.doc.write('body')
+        self.assertEqual(self.doc.getvalue(),
+                         six.b('\nTitle\n=====\n\nbody\n'))
+
+    def test_paragraphs_are_wrapped(self):
+        self.style.width = 20
+        self.doc.include_doc_string(
+            '<p>one two three four five six seven</p><p>eight</p>')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('\none two three four\nfive six seven\n\neight\n\n'))
+
+    def test_list_items_hang(self):
+        self.style.width = 12
+        self.doc.include_doc_string(
+            '<ul><li>one two three</li><li>four</li></ul>')
+        self.assertEqual(self.doc.getvalue(),
+                         six.b('\n* one two\n  three\n* four\n\n'))
+
+    def test_note_is_indented(self):
+        self.doc.include_doc_string('<note>careful</note>')
+        self.assertEqual(self.doc.getvalue(),
+                         six.b('\nNote:\n\n  careful\n\n'))
+
+    def test_codeblock_is_not_wrapped(self):
+        self.style.width = 10
+        self.style.codeblock('some long code\n  indented')
+        self.assertEqual(self.doc.getvalue(),
+                         six.b('\n  some long code\n    indented\n\n'))
+
+    def test_link_target(self):
+        self.doc.include_doc_string(
+            'See <a href="http://example.org">the docs</a>.')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('See the docs.\n\nthe docs: http://example.org\n'))
+
+    def test_link_without_text(self):
+        self.style.start_a(attrs=[('href', 'http://example.org')])
+        self.style.end_a()
+        self.assertEqual(self.doc.getvalue(), six.b('http://example.org\n'))
+
+    def test_toctree(self):
+        self.style.toctree()
+        self.style.tocitem('foo')
+        self.style.tocitem('bar')
+        self.style.hidden_toctree()
+        self.style.hidden_tocitem('baz')
+        self.assertEqual(self.doc.getvalue(), six.b('\n* foo\n* bar\n'))
+
+
+class TestHTMLStyle(unittest.TestCase):
+    def setUp(self):
+        self.doc = ReSTDocument(target='html', style_class=HTMLStyle)
+        self.style = self.doc.style
+
+    def test_inline_markup(self):
+        self.style.bold('foo')
+        self.style.italics('bar')
+        self.style.code('<baz>')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('<strong>foo</strong><em>bar</em>'
+                  '<code class="docutils literal">&lt;baz&gt;</code>'))
+
+    def test_headings(self):
+        self.style.h1('foo')
+        self.style.h2('bar')
+        self.style.h3('baz')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('\n<h1>foo</h1>\n\n<h2>bar</h2>\n\n<h3>baz</h3>\n'))
+
+    def test_doc_string(self):
+        self.doc.include_doc_string(
+            '<p>A <b>bold</b> &lt;word&gt;</p><note>careful</note>')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('\n<p>A <strong>bold</strong> &lt;word&gt;</p>\n'
+                  '<div class="admonition note">\n'
+                  '<p class="admonition-title">Note</p>\n'
+                  'careful\n</div>\n'))
+
+    def test_link(self):
+        self.doc.include_doc_string(
+            '<a href="http://example.org?a=1&amp;b=2">foo</a>')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('<a class="reference external" '
+                  'href="http://example.org?a=1&amp;b=2">foo</a> '))
+        self.assertEqual(self.doc.hrefs, {})
+
+    def test_link_without_text(self):
+        self.style.start_a(attrs=[('href', 'http://example.org')])
+        self.style.end_a()
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('<a class="reference external" href="http://example.org">'
+                  'http://example.org</a> '))
+
+    def test_link_without_text_at_start(self):
+        self.style.a_href = 'http://example.org'
+        self.style.end_a()
+        self.assertEqual(self.doc.getvalue(), six.b(''))
+        self.assertIsNone(self.style.a_href)
+
+    def test_toctree(self):
+        self.style.toctree()
+        self.style.tocitem('foo')
+        self.style.tocitem('bar', file_name='bar-file')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('\n<div class="toctree-wrapper">\n<ul>\n'
+                  '<li class="toctree-l1"><a class="reference internal" '
+                  'href="foo.html">foo</a></li>\n'
+                  '<li class="toctree-l1"><a class="reference internal" '
+                  'href="bar-file.html">bar</a></li>\n'
+                  '</ul>\n</div>\n'))
+
+    def test_sphinx_py_method(self):
+        self.style.start_sphinx_py_method('method', 'foo=None')
+        self.style.end_sphinx_py_method()
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('\n<dl class="py method">\n'
+                  '<dt id="method">method(foo=None)</dt>\n<dd>\n\n'
+                  '</dd>\n</dl>\n'))
+
+    def test_codeblock(self):
+        self.style.codeblock('if a < b:')
+        self.assertEqual(
+            self.doc.getvalue(),
+            six.b('\n<pre class="literal-block">if a &lt; b:</pre>\n'))
@@ -0,0 +1,68 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import threading
+
+import six
+from docutils.core import publish_string
+
+from tests import unittest
+from bcdoc.textwriter import TextRenderer, TextWriter
+
+
+class TestTextRenderer(unittest.TestCase):
+    def setUp(self):
+        self.renderer = TextRenderer()
+        self.contents = (
+            'Title\n'
+            '*****\n'
+            '\n'
+            'Some `link`_ with **bold** and ``code``.\n'
+            '\n'
+            '* foo\n'
+            '* bar\n'
+            '\n'
+            '.. note::\n'
+            '\n'
+            '   A note\n'
+            '\n'
+            '.. _link: http://example.org\n'
+        )
+
+    def test_matches_publish_string(self):
+        expected = publish_string(
+            self.contents, writer=TextWriter()).decode('utf-8')
+        self.assertEqual(self.renderer.render(self.contents), expected)
+
+    def test_render_bytes(self):
+        self.assertEqual(
+            self.renderer.render(six.b(self.contents)),
+            self.renderer.render(self.contents))
+
+    def test_renderer_is_reusable(self):
+        self.assertEqual(self.renderer.render('foo'), 'foo\n')
+        self.assertEqual(self.renderer.render('*bar*'), '*bar*\n')
+
+    def test_render_from_multiple_threads(self):
+        expected = self.renderer.render(self.contents)
+        results = []
+
+        def render():
+            for _ in range(10):
+                results.append(self.renderer.render(self.contents))
+
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [expected] * 40)
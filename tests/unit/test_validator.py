@@ -0,0 +1,136 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+import docutils.core
+import six
+
+from tests import unittest
+from bcdoc.restdoc import DocumentStructure
+from bcdoc.validator import ValidationProblem, validate
+
+
+class TestValidate(unittest.TestCase):
+    def assert_problems(self, value, *messages):
+        self.assertEqual([p.message for p in validate(value)],
+                         list(messages))
+
+    def test_valid_document(self):
+        doc = DocumentStructure('mydoc')
+        doc.style.h1('Title')
+        doc.style.h2('Subtitle')
+        doc.include_doc_string(
+            '<p>Some <b>bold</b>, <i>italic</i> and <code>code</code> '
+            'with <a href="http://a.com">a link</a> and the ARN '
+            'arn:aws:s3:::*</p><ul><li>one</li><li><b>two</b></li></ul>'
+            '<note>A note</note>')
+        doc.style.codeblock('**not markup')
+        doc.style.table_of_contents(title='Contents', depth=2)
+        self.assertEqual(validate(doc.flush_structure()), [])
+
+    def test_heading_border_too_short(self):
+        self.assert_problems(
+            '***\nTitle\n***\n',
+            "Heading border is shorter than its text 'Title'")
+
+    def test_heading_borders_do_not_match(self):
+        self.assert_problems(
+            '*****\nTitle\n=====\n',
+            'Heading underline does not match its overline')
+
+    def test_heading_underline_too_short(self):
+        self.assert_problems(
+            'Title\n===\n',
+            "Heading underline is shorter than its text 'Title'")
+
+    def test_unbalanced_inline_markup(self):
+        self.assert_problems('foo **bar', 'Unbalanced strong markup')
+        self.assert_problems('foo *bar', 'Unbalanced emphasis markup')
+        self.assert_problems('``foo ``', 'Unbalanced inline literal markup')
+
+    def test_escaped_markup(self):
+        self.assert_problems('foo \\*bar')
+
+    def test_link_without_target(self):
+        self.assert_problems('`foo`_', "Link 'foo' has no target")
+        self.assert_problems('`foo\\: bar`_\n\n.. _foo\\: bar: http://a.com\n')
+        self.assert_problems('`<http://a.com>`_ :ref:`foo`')
+
+    def test_link_targets_from_hrefs(self):
+        self.assertEqual(validate('`foo`_', link_targets={'foo': 'a'}), [])
+
+    def test_unexpected_indentation(self):
+        self.assert_problems('foo\nbar\n  baz\n', 'Unexpected indentation')
+        self.assert_problems('  foo\nbar\n', 'Unexpected unindent')
+
+    def test_definition_list_indentation(self):
+        self.assert_problems('foo\n   bar\n')
+        self.assert_problems('foo\n  bar\nbaz\n  qux\n')
+        self.assert_problems(
+            'foo\n  bar\nbaz\n',
+            'Definition list ends without a blank line')
+
+    def test_literal_block_ends_without_blank_line(self):
+        self.assert_problems(
+            'Para::\n\n    x = {\n  "a": 1\n}\n',
+            'Literal block ends without a blank line')
+        self.assert_problems('Para::\n\n    x = {\n  "a": 1\n\n}\n')
+
+    def test_list_and_literal_indentation(self):
+        self.assert_problems('* foo\n  bar\n* baz\n')
+        self.assert_problems('foo::\n\n      literal\n   still literal\n')
+
+    def test_problem_has_line_number(self):
+        self.assertEqual(validate('foo\n\nbar **baz', path=('a',)),
+                         [ValidationProblem(('a',), 3,
+                                            'Unbalanced strong markup')])
+
+
+class TestMatchesDocutils(unittest.TestCase):
+    def docutils_problem_lines(self, value):
+        warnings = six.StringIO()
+        docutils.core.publish_doctree(
+            value, settings_overrides={'warning_stream': warnings,
+                                       'report_level': 2})
+        return [int(line.split(':')[1])
+                for line in warnings.getvalue().splitlines()
+                if line.startswith('<string>:')]
+
+    def test_indentation_problems(self):
+        for value in [
+                'foo\n  bar\n',
+                'foo\nbar\n  baz\n',
+                'foo\n  bar\nbaz\n  qux\n',
+                'foo\n  bar\nbaz\nqux\n',
+                'foo\n  bar\n    baz\n  qux\n',
+                '* foo\n  bar\n    baz\n',
+                '* foo\n    bar\n',
+                'Title\n=====\n  indented\n',
+                'Para::\n\n    x = {\n  "a": 1\n}\n',
+                'Para::\n\n    x\n\ny\n']:
+            self.assertEqual(
+                [problem.line for problem in validate(value)],
+                self.docutils_problem_lines(value), value)
+
+
+class TestValidateDocumentStructure(unittest.TestCase):
+    def test_reports_section_path(self):
+        doc = DocumentStructure('mydoc')
+        doc.add_new_section('good').include_doc_string(
+            '<a href="http://a.com">foo</a>')
+        bad = doc.add_new_section('bad')
+        bad.writeln('foo')
+        bad.writeln('bar')
+        bad.writeln('  baz')
+        self.assertEqual(doc.validate(), [
+            ValidationProblem(('mydoc', 'bad'), 3, 'Unexpected indentation')])
+        # Validating does not write the link targets.
+        self.assertEqual(doc.flush_structure().count(b'.. _foo'), 1)
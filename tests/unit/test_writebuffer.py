@@ -0,0 +1,137 @@
+# Copyright 2015 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+from tests import unittest
+from bcdoc.writebuffer import WriteBuffer
+
+
+class Marker(object):
+    pass
+
+
+class TestWriteBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = WriteBuffer()
+
+    def write_many(self, count, prefix=''):
+        for i in range(count):
+            self.buffer.append('%s%s ' % (prefix, i))
+
+    def test_writes_are_merged(self):
+        self.write_many(10000)
+        writes = list(self.buffer)
+        self.assertLess(len(writes), 100)
+        self.assertEqual(''.join(writes),
+                         ''.join('%s ' % i for i in range(10000)))
+
+    def test_amend_most_recent_write(self):
+        self.write_many(100)
+        self.assertEqual(self.buffer.peek(), '99 ')
+        self.buffer.append(self.buffer.pop().rstrip(' '))
+        self.buffer.append('**')
+        self.assertTrue(''.join(self.buffer).endswith('98 99**'))
+
+    def test_pop_past_recent_writes(self):
+        self.write_many(100)
+        popped = [self.buffer.pop() for _ in range(WriteBuffer.keep_recent)]
+        self.assertEqual(popped[0], '99 ')
+        self.assertEqual(self.buffer.peek(), '95 ')
+        self.assertEqual(self.buffer.pop(), '95 ')
+        popped = [self.buffer.pop() for _ in range(95)]
+        self.assertEqual(popped[-1], '0 ')
+        self.assertEqual(self.buffer.tell(), 0)
+        self.assertEqual(list(self.buffer), [])
+
+    def test_pop_empty_write(self):
+        self.write_many(100)
+        self.buffer.append('')
+        self.write_many(100)
+        for _ in range(100):
+            self.buffer.pop()
+        self.assertEqual(self.buffer.pop(), '')
+        self.assertEqual(self.buffer.pop(), '99 ')
+
+    def test_pop_empty(self):
+        with self.assertRaises(IndexError):
+            self.buffer.pop()
+        with self.assertRaises(IndexError):
+            self.buffer.peek()
+
+    def test_tell(self):
+        self.buffer.append('foo')
+        self.buffer.append(Marker())
+        self.assertEqual(self.buffer.tell(), 2)
+
+    def test_delete_range(self):
+        self.write_many(100, 'a')
+        start = self.buffer.tell()
+        self.write_many(100, 'b')
+        end = self.buffer.tell()
+        self.write_many(100, 'c')
+        self.buffer.delete(start, end)
+        self.assertEqual(
+            ''.join(self.buffer),
+            ''.join('a%s ' % i for i in range(100)) +
+            ''.join('c%s ' % i for i in range(100)))
+        self.assertEqual(self.buffer.peek(), 'c99 ')
+
+    def test_delete_keeps_markers_outside_range(self):
+        first = Marker()
+        last = Marker()
+        self.buffer.append(first)
+        self.write_many(50)
+        start = self.buffer.tell()
+        self.buffer.append(Marker())
+        self.write_many(50)
+        end = self.buffer.tell()
+        self.buffer.append(last)
+        self.buffer.delete(start, end)
+        writes = list(self.buffer)
+        self.assertIs(writes[0], first)
+        self.assertIs(writes[-1], last)
+        self.assertEqual(len(writes), 3)
+
+    def test_delete_to_end(self):
+        self.write_many(10)
+        self.buffer.delete(0, self.buffer.tell())
+        self.assertEqual(list(self.buffer), [])
+        self.assertEqual(self.buffer.tell(), 0)
+
+    def test_slice(self):
+        self.write_many(1000)
+        marker = Marker()
+        self.buffer.append(marker)
+        self.buffer.append('end')
+        self.assertEqual(self.buffer.slice(5, 500),
+                         ['%s ' % i for i in range(5, 500)])
+        self.assertEqual(self.buffer.slice(999, 1005), ['999 ', marker, 'end'])
+        self.assertEqual(self.buffer.slice(10, 10), [])
+
+    def test_iter_writes(self):
+        self.write_many(100)
+        marker = Marker()
+        self.buffer.append(marker)
+        self.write_many(100)
+        expected = ['%s ' % i for i in range(100)]
+        self.assertEqual(list(self.buffer.iter_writes()),
+                         expected + [marker] + expected)
+
+    def test_unshared(self):
+        self.write_many(100)
+        self.assertIs(self.buffer.unshared(), self.buffer)
+        shared = self.buffer.share()
+        copy = shared.unshared()
+        self.assertIsNot(copy, self.buffer)
+        copy.append('end')
+        self.assertEqual(''.join(copy), ''.join(self.buffer) + 'end')
+        # The buffer is no longer shared once the other copy was made.
+        self.assertIs(self.buffer.unshared(), self.buffer)